@@ -0,0 +1,343 @@
+import sys
+import time
+import asyncio
+import logging
+import threading
+import functools
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from memory import ConversationMemory
+
+# Boty jako aktory. main.py prowadzi je przez ActorThread: wypowiedzi z STT i tury
+# przydzielane przez TurnScheduler wchodzą jako wiadomości od nadawców spoza runtime'u,
+# a odpowiedzi wracają przez outbox; mowa idzie przez jeden głośnik (SpeechSink).
+# Benchmark orkiestratora: python actors.py
+
+# Wiadomość między aktorami; hops - ile jeszcze odpowiedzi może wywołać (żeby rozmowa botów wygasła)
+Envelope = namedtuple("Envelope", "sender recipient text hops")
+BROADCAST = "*"
+
+def llm_responder(messages):
+    # Domyślny "mózg" aktora; działa w wątku albo w procesie puli, stąd import w środku
+    from bot import complete
+    try:
+        return complete(messages)
+    except Exception as e:
+        return f"Błąd API Open AI: {str(e)}"
+
+def stub_responder(messages, latency=0.0):
+    # Zamiast LLM do testów i benchmarku: stały czas "myślenia" i krótka odpowiedź
+    if latency:
+        time.sleep(latency)
+    return f"Odpowiedź na: {messages[-1]['content'][:40]}"
+
+def stub_speaker(text, name, latency=0.0):
+    # Zamiast TTS: udaje czas mówienia
+    if latency:
+        time.sleep(latency)
+
+class BotActor:
+    """Bot jako aktor: własna skrzynka, własna pamięć, jedna wiadomość naraz.
+
+    Skrzynka ma ograniczony rozmiar - gdy bot nie nadąża, nadawca czeka przy
+    wysyłaniu, zamiast zasypywać go kolejnymi wiadomościami. Odpowiedź (LLM) i
+    mowa (TTS) liczą się w puli runtime'u, więc pętla asyncio nie jest blokowana.
+    """
+
+    def __init__(self, runtime, name, system_prompt, mailbox_size=16):
+        self.runtime = runtime
+        self.name = name
+        self.system_prompt = system_prompt
+        self.memory = ConversationMemory()
+        self.mailbox = asyncio.Queue(maxsize=mailbox_size)
+        self.task = None
+        self.handled = 0
+        self.errors = 0
+
+    async def run(self):
+        while True:
+            envelope = await self.mailbox.get()
+            try:
+                await self.handle(envelope)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logging.error(f"Błąd aktora {self.name}: {str(e)}")
+            finally:
+                self.runtime.finished()
+
+    async def handle(self, envelope):
+        # Historia zostaje w aktorze; do puli idą tylko gotowe wiadomości (da się je przesłać do procesu)
+        messages = self.memory.build_messages(self.system_prompt, envelope.text)
+        reply = await self.runtime.call(self.runtime.responder, messages)
+        self.memory.add("user", envelope.text)
+        self.memory.add("assistant", reply)
+        self.handled += 1
+        logging.debug(f"🤖 {self.name} -> {envelope.sender}: {reply}")
+        if self.runtime.sink is not None:
+            # Jeden głośnik: odpowiedź idzie dalej od razu, a mowa czeka w kolejce na swoją kolej
+            if envelope.hops > 0:
+                await self.runtime.send(Envelope(self.name, envelope.sender, reply, envelope.hops - 1))
+            if self.runtime.preparer is not None:
+                await self.runtime.call(self.runtime.preparer, reply, self.name)
+            self.runtime.sink.say(reply, self.name)
+            return
+        if self.runtime.speaker is not None:
+            await self.runtime.call(self.runtime.speaker, reply, self.name)
+        if envelope.hops > 0:
+            await self.runtime.send(Envelope(self.name, envelope.sender, reply, envelope.hops - 1))
+
+class SpeechSink:
+    """Jeden głośnik dla wszystkich aktorów: wypowiedzi grają po kolei, w kolejności zgłoszeń.
+
+    Aktor zgłasza mowę i wraca do skrzynki, więc następny bot liczy odpowiedź,
+    gdy poprzedni jeszcze mówi. clear() porzuca wypowiedzi czekające w kolejce
+    (np. gdy człowiek przerwał bota); ta, która właśnie gra, kończy się sama.
+    """
+
+    def __init__(self, runtime, speaker):
+        self.runtime = runtime
+        self.speaker = speaker
+        self.queue = asyncio.Queue()
+        self.busy = False
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.spoken = 0
+        self.skipped = 0
+        self.task = asyncio.create_task(self.run(), name="glosnik")
+
+    def say(self, text, name):
+        self.idle.clear()
+        self.queue.put_nowait((text, name))
+
+    async def run(self):
+        while True:
+            text, name = await self.queue.get()
+            self.busy = True
+            try:
+                await self.runtime.call(self.speaker, text, name)
+                self.spoken += 1
+            except Exception as e:
+                logging.error(f"Błąd mowy {name}: {str(e)}")
+            finally:
+                self.busy = False
+                if self.queue.empty():
+                    self.idle.set()
+
+    def clear(self):
+        while not self.queue.empty():
+            self.queue.get_nowait()
+            self.skipped += 1
+        if not self.busy:
+            self.idle.set()
+
+    async def join(self):
+        await self.idle.wait()
+
+class ActorRuntime:
+    """Orkiestrator aktorów: rejestr botów i routing wiadomości - nic więcej.
+
+    processes=True - odpowiedzi liczą się w puli procesów zamiast wątków
+    (responder i speaker muszą wtedy dać się zapisać przez pickle). Wiadomości
+    do nieznanych odbiorców (np. człowiek, interfejs) trafiają do outbox.
+    serial_speaker=True - speaker to jeden głośnik (SpeechSink), a preparer(text, name)
+    może przygotować nagranie, zanim przyjdzie kolej; wymaga działającej pętli asyncio.
+    """
+
+    def __init__(self, responder=llm_responder, speaker=None, workers=8, processes=False,
+                 mailbox_size=16, send_timeout=5.0, serial_speaker=False, preparer=None):
+        self.responder = responder
+        self.speaker = speaker
+        self.preparer = preparer
+        self.executor = ProcessPoolExecutor(workers) if processes else ThreadPoolExecutor(workers)
+        self.mailbox_size = mailbox_size
+        self.send_timeout = send_timeout
+        self.actors = {}
+        self.outbox = asyncio.Queue()
+        self.pending = 0  # wiadomości w skrzynkach i w obróbce
+        self.idle = asyncio.Event()
+        self.idle.set()
+        self.routed = 0
+        self.dropped = 0
+        self.sink = SpeechSink(self, speaker) if serial_speaker and speaker is not None else None
+
+    def spawn(self, name, system_prompt):
+        actor = BotActor(self, name, system_prompt, self.mailbox_size)
+        actor.task = asyncio.create_task(actor.run(), name=f"aktor-{name}")
+        self.actors[name] = actor
+        logging.debug(f"➕ Aktor {name} uruchomiony")
+        return actor
+
+    def remove(self, name):
+        actor = self.actors.pop(name, None)
+        if actor is not None:
+            actor.task.cancel()
+            # Nieobsłużone wiadomości nie będą już przetworzone
+            for _ in range(actor.mailbox.qsize()):
+                actor.mailbox.get_nowait()
+                self.finished()
+
+    async def call(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def send(self, envelope):
+        if envelope.recipient == BROADCAST:
+            recipients = [name for name in self.actors if name != envelope.sender]
+        else:
+            recipients = [envelope.recipient]
+        for name in recipients:
+            delivery = envelope._replace(recipient=name)
+            actor = self.actors.get(name)
+            if actor is None:
+                self.outbox.put_nowait(delivery)
+                self.routed += 1
+                continue
+            self.pending += 1
+            self.idle.clear()
+            try:
+                # Pełna skrzynka = nadawca czeka; po send_timeout wiadomość przepada (zamiast zakleszczenia)
+                await asyncio.wait_for(actor.mailbox.put(delivery), self.send_timeout)
+                self.routed += 1
+            except asyncio.TimeoutError:
+                self.dropped += 1
+                self.finished()
+                logging.warning(f"⚠️ Skrzynka {name} pełna, wiadomość od {envelope.sender} odrzucona")
+
+    def finished(self):
+        self.pending -= 1
+        if self.pending == 0:
+            self.idle.set()
+
+    async def join(self):
+        # Czeka, aż wszystkie rozmowy wygasną: skrzynki puste i nic w obróbce (i głośnik ucichł)
+        await self.idle.wait()
+        if self.sink is not None:
+            await self.sink.join()
+
+    async def shutdown(self):
+        for name in list(self.actors):
+            self.remove(name)
+        if self.sink is not None:
+            self.sink.task.cancel()
+        await asyncio.sleep(0)
+        self.executor.shutdown(wait=True)
+
+    def metrics(self):
+        metrics = {
+            "actors": len(self.actors),
+            "routed": self.routed,
+            "dropped": self.dropped,
+            "handled": sum(actor.handled for actor in self.actors.values()),
+            "errors": sum(actor.errors for actor in self.actors.values()),
+        }
+        if self.sink is not None:
+            metrics.update(spoken=self.sink.spoken, skipped=self.sink.skipped)
+        return metrics
+
+class ActorThread:
+    """ActorRuntime na własnej pętli asyncio w wątku w tle - dla synchronicznej pętli main.py.
+
+    Metody blokują wołającego, aż pętla je wykona. ask() wysyła wiadomość od
+    nadawcy spoza runtime'u (człowiek, prowadzący tury) i zwraca odpowiedzi
+    adresowanych botów z outbox - gdy tylko je policzą, nie czekając na mowę.
+    """
+
+    def __init__(self, **kwargs):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True, name="aktorzy")
+        self.thread.start()
+        self.runtime = self.run(self._create(kwargs))
+
+    async def _create(self, kwargs):
+        # Kolejki, zdarzenia i głośnik powstają w pętli, która będzie ich używać
+        return ActorRuntime(**kwargs)
+
+    def run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def spawn(self, name, system_prompt):
+        return self.run(self._call(self.runtime.spawn, name, system_prompt))
+
+    def remove(self, name):
+        self.run(self._call(self.runtime.remove, name))
+
+    async def _call(self, fn, *args):
+        return fn(*args)
+
+    def ask(self, envelope):
+        return self.run(self._ask(envelope))
+
+    async def _ask(self, envelope):
+        if envelope.recipient == BROADCAST:
+            expected = sum(1 for name in self.runtime.actors if name != envelope.sender)
+        else:
+            expected = 1 if envelope.recipient in self.runtime.actors else 0
+        await self.runtime.send(envelope)
+        replies = []
+        while len(replies) < expected:
+            reply = asyncio.ensure_future(self.runtime.outbox.get())
+            idle = asyncio.ensure_future(self.runtime.idle.wait())
+            done, _ = await asyncio.wait({reply, idle}, return_when=asyncio.FIRST_COMPLETED)
+            idle.cancel()
+            if reply in done:
+                replies.append(reply.result())
+                continue
+            # Wszyscy skończyli, a części odpowiedzi brak (błąd aktora, bot usunięty w trakcie)
+            reply.cancel()
+            while not self.runtime.outbox.empty():
+                replies.append(self.runtime.outbox.get_nowait())
+            break
+        return replies
+
+    def join(self):
+        self.run(self.runtime.join())
+
+    def hush(self):
+        # Bezpieczne z dowolnego wątku (np. ze speakera w puli)
+        if self.runtime.sink is not None:
+            self.loop.call_soon_threadsafe(self.runtime.sink.clear)
+
+    def shutdown(self):
+        self.run(self.runtime.shutdown())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+async def run_benchmark(n_bots, hops, llm_latency, tts_latency, workers, processes):
+    runtime = ActorRuntime(
+        responder=functools.partial(stub_responder, latency=llm_latency),
+        speaker=functools.partial(stub_speaker, latency=tts_latency) if tts_latency else None,
+        workers=workers,
+        processes=processes,
+    )
+    for i in range(n_bots):
+        runtime.spawn(f"bot{i}", f"Jesteś botem numer {i}.")
+    start = time.time()
+    # Pary (0,1), (2,3)...: każda para rozmawia, aż wyczerpie hops
+    for i in range(0, n_bots - 1, 2):
+        await runtime.send(Envelope(f"bot{i + 1}", f"bot{i}", "Cześć, co słychać?", hops))
+    await runtime.join()
+    elapsed = time.time() - start
+    metrics = runtime.metrics()
+    await runtime.shutdown()
+    return metrics, elapsed
+
+def benchmark(n_bots=200, hops=10, llm_latency=0.01, tts_latency=0.0, workers=64, processes=False):
+    # Ile wiadomości na sekundę przechodzi przez orkiestrator przy atrapach LLM/TTS
+    metrics, elapsed = asyncio.run(run_benchmark(n_bots, hops, llm_latency, tts_latency, workers, processes))
+    rate = metrics["routed"] / elapsed if elapsed else 0.0
+    logging.info(f"🎭 {n_bots} aktorów ({'procesy' if processes else 'wątki'}, {workers} workerów), "
+                 f"LLM {llm_latency * 1000:.0f} ms: {metrics['routed']} wiadomości w {elapsed:.2f}s = {rate:.0f} wiadomości/s")
+    logging.info(f"🎭 Metryki: {metrics}")
+    return rate
+
+if __name__ == "__main__":
+    # python actors.py [liczba_botów] [hops] [opóźnienie_LLM_s] [procesy 0/1]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    args = sys.argv[1:]
+    benchmark(
+        n_bots=int(args[0]) if len(args) > 0 else 200,
+        hops=int(args[1]) if len(args) > 1 else 10,
+        llm_latency=float(args[2]) if len(args) > 2 else 0.01,
+        processes=len(args) > 3 and args[3] == "1",
+    )
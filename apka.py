@@ -6,18 +6,15 @@ from logging.handlers import QueueHandler
 import queue
 import threading
 import time
-import random
-import speech_recognition as sr
-from gtts import gTTS
-from playsound import playsound
+import stt
 import os
-import tempfile
 import sounddevice as sd
-import numpy as np
-import ggwave
-from queue import Queue
 from openai import OpenAI
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+from tts import speak
+from turns import TurnScheduler, Speculator, interruptible
+from gglink import prepare_ggwave, link_quality, broadcast_exchange
 
 # Konfiguracja logowania
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -26,14 +23,6 @@ logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %
 load_dotenv("klucz.env")
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-# Inicjalizacja GGWave
-try:
-    ggwave_instance = ggwave.init()
-    logging.info("✅ GGWave zainicjalizowany poprawnie.")
-except Exception as e:
-    logging.error(f"❌ Błąd inicjalizacji GGWave: {e}")
-    ggwave_instance = None
-
 # Funkcja OpenAI
 def get_response(user_input, system_prompt):
     try:
@@ -52,135 +41,39 @@ def get_response(user_input, system_prompt):
         logging.error(f"Błąd API Open AI: {str(e)}")
         return f"Błąd API Open AI: {str(e)}"
 
-# Funkcje GGWave
-def send_via_ggwave(message: str, protocolId: int = 1, volume: int = 60):
-    try:
-        if not message:
-            logging.warning("Pusta wiadomość, pomijam wysyłanie.")
-            return None
-
-        if len(message.encode('utf-8')) > 100:
-            logging.warning(f"Wiadomość zbyt długa ({len(message.encode('utf-8'))} bajtów), obcinam do 100 znaków.")
-            message = message[:100]
-
-        waveform = ggwave.encode(message, protocolId=protocolId, volume=volume)
-        audio = np.frombuffer(waveform, dtype=np.float32)
-        logging.debug(f"Rozmiar waveform: {len(waveform)} bajtów")
-        sd.play(audio, samplerate=48000)
-        sd.wait()
-        logging.info(f"📡 [GGWave] Wysłano: {message}")
-        time.sleep(0.3)
-        return waveform
-    except Exception as e:
-        logging.error(f"Błąd przy wysyłaniu GGWave: {e}")
-        return None
-
-def receive_via_ggwave(queue: Queue, stop_event: threading.Event, bot_name: str, silence_timeout: float = 15.0):
-    if ggwave_instance is None:
-        logging.error("❌ Brak instancji GGWave — nie można odbierać.")
-        queue.put((bot_name, None))
-        return
-
-    decoded = None
-    last_data_time = time.time()
-    start_time = time.time()
-
-    def callback(indata, frames, time_info, status):
-        nonlocal decoded, last_data_time
-        if status:
-            logging.debug(f"[{bot_name}] Status: {status}")
-        if stop_event.is_set():
-            return
-            
-        try:
-            audio_level = np.max(np.abs(indata))
-            if audio_level > 0.001:
-                last_data_time = time.time()
-                logging.debug(f"[{bot_name}] Poziom audio: {audio_level:.6f}")
-
-            data_bytes = indata.tobytes()
-            res = ggwave.decode(ggwave_instance, data_bytes)
-            
-            if res:
-                try:
-                    decoded_text = res.decode("utf-8")
-                    logging.info(f"🎯 [{bot_name}] ZDEKODOWANO: '{decoded_text}'")
-                    decoded = decoded_text
-                    queue.put((bot_name, decoded))
-                    return
-                except Exception as e:
-                    logging.debug(f"[{bot_name}] Błąd dekodowania UTF-8: {e}")
-                    decoded = str(res)
-                    queue.put((bot_name, decoded))
-                    return
-                    
-        except Exception as e:
-            logging.debug(f"[{bot_name}] Błąd w callback: {e}")
-
-    try:
-        logging.info(f"🎧 {bot_name} nasłuchuje GGWave (timeout: {silence_timeout}s)...")
-        
-        with sd.InputStream(
-            callback=callback,
-            channels=1,
-            samplerate=48000,
-            dtype='float32',
-            blocksize=1024,
-            latency='low',
-            device=sd.default.device[0]
-        ) as stream:
-            while not stop_event.is_set():
-                if time.time() - last_data_time > silence_timeout:
-                    logging.info(f"⏰ [{bot_name}] Timeout ciszy ({silence_timeout}s)")
-                    break
-                if time.time() - start_time > 30:
-                    logging.info(f"⏰ [{bot_name}] Maksymalny czas nasłuchiwania")
-                    break
-                time.sleep(0.1)
-                
-    except Exception as e:
-        logging.error(f"❌ Błąd InputStream dla {bot_name}: {e}")
-        queue.put((bot_name, None))
-        return
-
-    if decoded:
-        logging.info(f"✅ {bot_name} ODEBRAŁ: '{decoded}'")
-        queue.put((bot_name, decoded))
-    else:
-        logging.info(f"❌ {bot_name} nic nie odebrał")
-        queue.put((bot_name, None))
+# Okno dla człowieka przed turą bota: od wybrzmienia poprzedniej wypowiedzi (po ogonie
+# echa), przedłużane, dopóki ktoś mówi
+LISTEN_TIMEOUT = float(os.getenv("TURN_LISTEN_TIMEOUT", "1.0"))
+# Po tylu sekundach bez człowieka boty przechodzą na GGWave
+GGWAVE_AFTER = float(os.getenv("GGWAVE_AFTER", "10"))
+# BARGE_IN=1 - człowiek przerywa mówiącego bota; tylko ze słuchawkami, bo z głośnikami
+# głos bota też byłby "mową" (domyślnie mikrofon jest pomijany na czas odtwarzania)
+BARGE_IN = os.getenv("BARGE_IN", "0") == "1"
+# Ile spekulacyjnych zapytań (odpowiedź następnego mówcy zawczasu) może być naraz w locie
+SPECULATION_BUDGET = int(os.getenv("SPECULATION_BUDGET", "2"))
 
 # Funkcja STT
-def listen():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        logging.info("🎤 Mów teraz... (5 sekund na rozpoczęcie)")
-        try:
-            audio = r.listen(source, timeout=5)
-            text = r.recognize_google(audio, language="pl-PL")
-            return text
-        except sr.WaitTimeoutError:
-            return ""
-        except sr.UnknownValueError:
-            return ""
-        except sr.RequestError as e:
-            logging.error(f"Błąd połączenia ze STT: {str(e)}")
-            return ""
-
-# Funkcja TTS
-def speak(text):
-    if not text or not text.strip():
-        return
-    try:
-        logging.info(f"Mówię: {text}")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-            tts = gTTS(text=text, lang="pl")
-            tts.save(fp.name)
-            temp_path = fp.name
-        playsound(temp_path)
-        os.remove(temp_path)
-    except Exception as e:
-        logging.error(f"Błąd w TTS: {e}")
+def listen(timeout=LISTEN_TIMEOUT):
+    # Wspólna sesja z stt.py; błędy połączenia tylko logujemy, żeby nie trafiły do rozmowy
+    text = stt.get_listener().listen_turn(timeout)
+    if text.startswith(stt.STT_ERROR):
+        logging.error(text)
+        return ""
+    return text
+
+def say(text, speaker=None):
+    # -> True, jeśli człowiek przerwał wypowiedź
+    if not BARGE_IN:
+        speak(text, speaker=speaker)
+        return False
+    return interruptible(lambda cancelled: speak(text, speaker=speaker, cancelled=cancelled), stt.get_listener().speaking)
+
+def speculate(bot, text, ggwave=False):
+    # Odpowiedź liczona zawczasu; dla GGWave od razu też fala (trafia do cache kodera)
+    response = get_response(text, bot.system_prompt)
+    if ggwave:
+        prepare_ggwave(response, link_quality.peek())
+    return response
 
 # Klasa Bot
 class Bot:
@@ -198,22 +91,54 @@ class MainThread(QThread):
         self.bots = []
         self.last_input = None
         self.last_speaker = None
-        self.silence_counter = 0
+        self.last_human = time.time()
+        self.scheduler = TurnScheduler()
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.speculator = Speculator(self.executor, budget=SPECULATION_BUDGET)
+
+    def find_bot(self, name):
+        return next((bot for bot in self.bots if bot.name == name), None)
+
+    def reply(self, bot, context):
+        # Gotowa odpowiedź z poprzedniej tury, jeśli dotyczy tego bota i tego samego kontekstu
+        future = self.speculator.take((bot.name, context))
+        if future is not None:
+            try:
+                return future.result()
+            except Exception as e:
+                logging.debug(f"Błąd spekulacji dla {bot.name}: {e}")
+        return get_response(context, bot.system_prompt)
+
+    def speculate_next(self, current_bot, response, ggwave=False):
+        # Kolejny mówca liczy odpowiedź na bieżącą wypowiedź, gdy ta jeszcze trwa
+        self.speculator.discard()  # spekulacje na tę turę są już nieaktualne
+        next_bot = self.find_bot(self.scheduler.peek(exclude=current_bot.name))
+        if next_bot is not None and next_bot is not current_bot:
+            self.speculator.start((next_bot.name, response), speculate, next_bot, response, ggwave)
+
+    def say(self, text, speaker=None):
+        interrupted = say(text, speaker=speaker)
+        if interrupted:
+            self.speculator.discard()
+        return interrupted
 
     def run(self):
         self.running = True
         self.log_signal.emit("🤖 Witaj! Rozpoczynamy rozmowę. Powiedz 'do widzenia', aby zakończyć.")
         self.log_signal.emit("Komendy: 'Dodaj bota <nazwa> jako <charakter>', 'Idź bot <nazwa>'")
+        stt.get_listener().gate_playback = not BARGE_IN  # przerywanie wymaga słuchania także w trakcie mowy bota
 
         while self.running:
             try:
                 user_input = listen()
 
                 if user_input:
-                    self.silence_counter = 0
+                    self.last_human = time.time()
                     self.log_signal.emit(f"🧍 Ty: {user_input}")
                     self.last_input = user_input
                     self.last_speaker = None
+                    self.speculator.discard()
+                    self.scheduler.mention(user_input)
 
                     # Obsługa poleceń
                     if user_input.lower().startswith("dodaj bota"):
@@ -222,6 +147,7 @@ class MainThread(QThread):
                             bot_name = parts[0].replace("dodaj bota ", "").strip()
                             bot_character = parts[1].strip()
                             self.bots.append(Bot(bot_name, f"Jesteś {bot_character}, który odpowiada w języku polskim."))
+                            self.scheduler.add(bot_name)
                             response = f"Dodano bota {bot_name} jako {bot_character}."
                             self.log_signal.emit(f"🤖 System: {response}")
                             speak(response)
@@ -234,9 +160,11 @@ class MainThread(QThread):
                     if user_input.lower().startswith("idź bot"):
                         try:
                             bot_name = user_input.lower().replace("idź bot ", "").strip()
-                            bots_before = len(self.bots)
+                            removed = [bot for bot in self.bots if bot.name.lower() == bot_name.lower()]
                             self.bots = [bot for bot in self.bots if bot.name.lower() != bot_name.lower()]
-                            if len(self.bots) < bots_before:
+                            for bot in removed:
+                                self.scheduler.remove(bot.name)
+                            if removed:
                                 response = f"Usunięto bota {bot_name}."
                                 if self.last_speaker and self.last_speaker.lower() == bot_name.lower():
                                     self.last_speaker = None
@@ -257,8 +185,7 @@ class MainThread(QThread):
                         self.running = False
                         break
 
-                else:
-                    self.silence_counter += 1
+                silence = time.time() - self.last_human
 
                 if self.bots:
                     if user_input:
@@ -266,76 +193,60 @@ class MainThread(QThread):
                             response = get_response(user_input, bot.system_prompt)
                             self.log_signal.emit(f"🤖 {bot.name}: {response}")
                             try:
-                                speak(f"{bot.name} mówi: {response}")
+                                if bot is self.bots[-1]:
+                                    self.speculate_next(bot, response)
+                                interrupted = self.say(response, speaker=bot.name)
                                 self.last_input = response
                                 self.last_speaker = bot.name
-                                time.sleep(0.5)
+                                if interrupted:
+                                    break
                             except Exception as e:
                                 self.log_signal.emit(f"Błąd TTS dla {bot.name}: {str(e)}")
 
+                    # Następny mówca z kolejki (sprawiedliwie, wywołani po imieniu wcześniej); bez powtórzeń z rzędu
+                    upcoming = self.scheduler.peek(exclude=self.last_speaker)
+                    if upcoming == self.last_speaker or stt.get_listener().speaking.is_set():
+                        upcoming = None
+
                     # Komunikacja GGWave między botami
-                    if self.silence_counter >= 2 and len(self.bots) > 1:
-                        current_bot = random.choice([b for b in self.bots if b.name != self.last_speaker])
+                    if upcoming and silence >= GGWAVE_AFTER and len(self.bots) > 1:
+                        current_bot = self.find_bot(self.scheduler.next(exclude=self.last_speaker))
                         context = self.last_input if self.last_input else "Cześć, co słychać?"
-                        response = get_response(context, current_bot.system_prompt)
+                        response = self.reply(current_bot, context)
                         self.log_signal.emit(f"🤖 {current_bot.name}: {response}")
+                        self.scheduler.mention(response)
+                        self.speculate_next(current_bot, response, ggwave=True)
 
-                        result_queue = Queue()
-                        stop_event = threading.Event()
-                        threads = []
-
-                        for bot in [b for b in self.bots if b.name != current_bot.name]:
-                            thread = threading.Thread(
-                                target=receive_via_ggwave,
-                                args=(result_queue, stop_event, bot.name, 12.0)
-                            )
-                            threads.append(thread)
-                            thread.start()
-
-                        time.sleep(1.0)
-                        send_thread = threading.Thread(target=send_via_ggwave, args=(response,))
-                        send_thread.start()
-
-                        send_thread.join()
-                        time.sleep(2.0)
-
-                        stop_event.set()
-
-                        for thread in threads:
-                            thread.join()
-
-                        received_messages = []
-                        while not result_queue.empty():
-                            bot_name, decoded = result_queue.get()
-                            if decoded:
-                                received_messages.append((bot_name, decoded))
+                        # mikrofon STT zwalnia urządzenie na czas odbioru GGWave (ten sam sprzęt wejściowy)
+                        receivers = [bot.name for bot in self.bots if bot.name != current_bot.name]
+                        received_messages = broadcast_exchange(current_bot.name, receivers, response,
+                                                               listener=stt.get_listener())
 
                         if received_messages:
-                            bot_name, decoded = random.choice(received_messages)
+                            bot_name, decoded = received_messages[0]
                             self.log_signal.emit(f"📡 {bot_name} (GGWave odebrane): {decoded}")
                             self.last_input = decoded
                             self.last_speaker = current_bot.name
                         else:
                             self.log_signal.emit("⚠️ Żaden bot nie odebrał wiadomości przez GGWave, używam TTS")
-                            speak(f"{current_bot.name} mówi: {response}")
+                            speak(response, speaker=current_bot.name)
                             self.last_input = response
                             self.last_speaker = current_bot.name
 
-                    elif len(self.bots) >= 1:
-                        available_bots = [bot for bot in self.bots if bot.name != self.last_speaker]
-                        if available_bots:
-                            self.log_signal.emit("🤖 Boty rozmawiają między sobą (tryb normalny)...")
-                            current_bot = random.choice(available_bots)
-                            context = self.last_input if self.last_input else "Cześć, co słychać?"
-                            response = get_response(context, current_bot.system_prompt)
-                            self.log_signal.emit(f"🤖 {current_bot.name}: {response}")
-                            try:
-                                speak(f"{current_bot.name} mówi: {response}")
-                                self.last_input = response
-                                self.last_speaker = current_bot.name
-                                time.sleep(0.5)
-                            except Exception as e:
-                                self.log_signal.emit(f"Błąd TTS dla {current_bot.name}: {str(e)}")
+                    elif upcoming:
+                        self.log_signal.emit("🤖 Boty rozmawiają między sobą (tryb normalny)...")
+                        current_bot = self.find_bot(self.scheduler.next(exclude=self.last_speaker))
+                        context = self.last_input if self.last_input else "Cześć, co słychać?"
+                        response = self.reply(current_bot, context)
+                        self.log_signal.emit(f"🤖 {current_bot.name}: {response}")
+                        self.scheduler.mention(response)
+                        self.speculate_next(current_bot, response)
+                        try:
+                            self.say(response, speaker=current_bot.name)
+                            self.last_input = response
+                            self.last_speaker = current_bot.name
+                        except Exception as e:
+                            self.log_signal.emit(f"Błąd TTS dla {current_bot.name}: {str(e)}")
 
                 if not self.bots and user_input and not user_input.lower().startswith(("dodaj bota", "do widzenia")):
                     response = "Nie ma żadnych botów. Dodaj bota komendą 'Dodaj bota <nazwa> jako <charakter>'."
@@ -1,23 +1,59 @@
 from openai import OpenAI
 from dotenv import load_dotenv
 import os
+import logging
 from openai import OpenAI
+from cache import TieredCache, make_key, normalize_text
 
 load_dotenv("klucz.env")
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
-def get_response(user_input, system_prompt):
-    try:
+MODEL = "gpt-3.5-turbo"
+SAMPLING = {"max_tokens": 30, "temperature": 0.8, "top_p": 0.95}
+
+# Cache odpowiedzi: LRU w pamięci + opcjonalnie katalog na dysku (RESPONSE_CACHE_DIR)
+response_cache = TieredCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", "256")),
+    disk_dir=os.getenv("RESPONSE_CACHE_DIR") or None,
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "86400")),
+    dumps=lambda text: text.encode("utf-8"),
+    loads=lambda data: data.decode("utf-8")
+)
+
+def complete(messages):
+    # Odpowiedź na gotową listę wiadomości (ostatnia to pytanie) - same dane, więc
+    # można to wołać także w procesie puli (actors.py)
+    # Klucz: model, cały kontekst (z znormalizowanym wejściem) i parametry próbkowania
+    key = make_key(MODEL, messages[:-1], normalize_text(messages[-1]["content"]), SAMPLING)
+
+    def compute():
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": system_prompt},  # Używamy przekazanego system_prompt
-                {"role": "user", "content": user_input}
-            ],
-            max_tokens=30,
-            temperature=0.8,
-            top_p=0.95
+            model=MODEL,
+            messages=messages,
+            **SAMPLING
         )
         return response.choices[0].message.content.strip()
+
+    answer = response_cache.get_or_compute(key, compute)
+    logging.debug(f"Cache odpowiedzi: {response_cache.stats()}")
+    return answer
+
+def get_response(user_input, system_prompt, memory=None, remember=True):
+    # memory (ConversationMemory) - historia bota; bez niej wysyłamy tylko [system, user]
+    # remember=False - zapytanie spekulacyjne: wynik trafia tylko do cache, nie do historii
+    if memory is not None:
+        messages = memory.build_messages(system_prompt, user_input)
+    else:
+        messages = [
+            {"role": "system", "content": system_prompt},  # Używamy przekazanego system_prompt
+            {"role": "user", "content": user_input}
+        ]
+
+    try:
+        answer = complete(messages)
+        if memory is not None and remember:
+            memory.add("user", user_input)
+            memory.add("assistant", answer)
+        return answer
     except Exception as e:
-        return f"Błąd API Open AI: {str(e)}"
\ No newline at end of file
+        return f"Błąd API Open AI: {str(e)}"
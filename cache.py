@@ -0,0 +1,163 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+def make_key(*parts):
+    # Stabilny klucz z dowolnych danych dających się zapisać jako JSON
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def normalize_text(text):
+    # Wielkość liter, interpunkcja i białe znaki nie zmieniają klucza
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
+
+class DiskCache:
+    """Katalog z plikami (jeden klucz = jeden plik), z TTL i limitem rozmiaru."""
+
+    def __init__(self, directory, ttl=24 * 3600, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.size = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.is_file())
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def get(self, key):
+        path = self.path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                self.remove(path)
+                return None
+            with open(path, "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        path = self.path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            with self.lock:
+                old_size = os.path.getsize(path) if os.path.exists(path) else 0
+                os.replace(tmp_path, path)
+                self.size += len(data) - old_size
+            if self.size > self.max_bytes:
+                self.evict()
+        except OSError as e:
+            logging.debug(f"Błąd zapisu cache na dysk: {e}")
+
+    def remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            with self.lock:
+                self.size -= size
+        except OSError:
+            pass
+
+    def evict(self):
+        # Najpierw przeterminowane, potem najstarsze, aż zejdziemy poniżej 90% limitu
+        now = time.time()
+        entries = sorted(
+            (entry.stat().st_mtime, entry.path) for entry in os.scandir(self.directory)
+            if entry.is_file() and not entry.name.endswith(".tmp")
+        )
+        for mtime, path in entries:
+            if now - mtime > self.ttl or self.size > self.max_bytes * 0.9:
+                self.remove(path)
+        logging.debug(f"Cache na dysku po czyszczeniu: {self.size} bajtów")
+
+class TieredCache:
+    """LRU w pamięci + opcjonalny katalog na dysku.
+
+    get_or_compute() liczy wartość dla danego klucza tylko raz - równoległe
+    wywołania z tym samym kluczem czekają na wynik pierwszego.
+    """
+
+    def __init__(self, maxsize=256, disk_dir=None, ttl=24 * 3600, max_bytes=50 * 1024 * 1024,
+                 dumps=lambda value: value, loads=lambda data: data):
+        self.maxsize = maxsize
+        self.memory = OrderedDict()
+        self.disk = DiskCache(disk_dir, ttl, max_bytes) if disk_dir else None
+        self.dumps = dumps
+        self.loads = loads
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.shared = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+        return None
+
+    def put(self, key, value, to_disk=True):
+        with self.lock:
+            self.memory[key] = value
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.maxsize:
+                self.memory.popitem(last=False)
+        if to_disk and self.disk:
+            self.disk.put(key, self.dumps(value))
+
+    def get_or_compute(self, key, compute):
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            future = self.inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self.inflight[key] = Future()
+            else:
+                self.shared += 1
+        if not leader:
+            return future.result()
+
+        try:
+            data = self.disk.get(key) if self.disk else None
+            if data is not None:
+                value = self.loads(data)
+                with self.lock:
+                    self.disk_hits += 1
+                self.put(key, value, to_disk=False)
+            else:
+                with self.lock:
+                    self.misses += 1
+                value = compute()
+                self.put(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self.lock:
+                self.inflight.pop(key, None)
+
+    def stats(self):
+        with self.lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "shared": self.shared,
+                "misses": self.misses,
+                "size": len(self.memory),
+            }
@@ -0,0 +1,31 @@
+import os
+import math
+import wave
+import random
+import struct
+
+# Nagranie do testów nasłuchu: dwie "wypowiedzi" (ton 440 Hz) rozdzielone ciszą (w blokach
+# sr.AudioFile po 0.256 s) dłuższą niż pause_threshold, z lekkim szumem tła. Bez mowy - benchmark
+# silników (python stt.py) potrzebuje własnych nagrań, ale podział na wypowiedzi i bramkę
+# odtwarzania sprawdza się tym.
+SAMPLE_RATE = 16000
+LAYOUT = [(0.5, False), (0.8, True), (1.6, False), (0.8, True), (1.2, False)]  # (sekundy, ton)
+
+def samples(seed=0):
+    rng = random.Random(seed)
+    for seconds, tone in LAYOUT:
+        for i in range(int(seconds * SAMPLE_RATE)):
+            value = rng.gauss(0.0, 30.0)
+            if tone:
+                value += 8000.0 * math.sin(2 * math.pi * 440.0 * i / SAMPLE_RATE)
+            yield max(-32768, min(32767, int(value)))
+
+def write(path):
+    with wave.open(path, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(SAMPLE_RATE)
+        wf.writeframes(b"".join(struct.pack("<h", value) for value in samples()))
+
+if __name__ == "__main__":
+    write(os.path.join(os.path.dirname(os.path.abspath(__file__)), "bursts.wav"))
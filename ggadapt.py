@@ -0,0 +1,105 @@
+import time
+import logging
+import threading
+from collections import deque
+
+# Protokoły GGWave i ich nominalna przepustowość (B/s), od najszybszego
+AUDIBLE = (2, 1, 0)      # AUDIBLE_FASTEST, AUDIBLE_FAST, AUDIBLE_NORMAL
+ULTRASOUND = (5, 4, 3)   # ULTRASOUND_FASTEST, _FAST, _NORMAL
+DT = (8, 7, 6)           # DT_FASTEST, DT_FAST, DT_NORMAL
+NOMINAL_RATE = {0: 8, 1: 12, 2: 16, 3: 8, 4: 12, 5: 16, 6: 3, 7: 5, 8: 8}
+
+class LinkQualityEstimator:
+    """Wybór protokołu na podstawie ostatnich wyników dekodowania.
+
+    Bierze najszybszy protokół, który w oknie ostatnich prób dekodował się
+    wystarczająco często; po porażkach schodzi na wolniejszy (odporniejszy), a co
+    probe_every udanych wysyłek sprawdza jeden stopień szybszy. Bez losowości -
+    ta sama sekwencja wyników daje zawsze ten sam wybór. peek() mówi, co
+    wybrałby choose(), ale nie zużywa próby (np. dla spekulacyjnego kodowania).
+    """
+
+    def __init__(self, protocols=AUDIBLE, min_success=0.75, window=8, probe_every=5):
+        self.protocols = tuple(protocols)
+        self.min_success = min_success
+        self.probe_every = probe_every
+        self.results = {protocol: deque(maxlen=window) for protocol in self.protocols}
+        self.throughput = {}  # protokół -> zmierzone B/s (średnia krocząca)
+        self.since_probe = 0
+        self.lock = threading.Lock()
+
+    def record(self, protocol, success, latency=None, size=None):
+        if protocol not in self.results:
+            return
+        with self.lock:
+            self.results[protocol].append(bool(success))
+            if success and latency and size:
+                rate = size / latency
+                previous = self.throughput.get(protocol)
+                self.throughput[protocol] = rate if previous is None else 0.7 * previous + 0.3 * rate
+            self.since_probe = self.since_probe + 1 if success else 0
+        logging.debug(f"[GGWave] Protokół {protocol}: {'OK' if success else 'błąd'}, skuteczność {self.success_rate(protocol):.2f}")
+
+    def success_rate(self, protocol):
+        results = self.results[protocol]
+        return sum(results) / len(results) if results else 1.0  # nieznany = warto spróbować
+
+    def ranked(self):
+        # Od najszybszego. Zmierzona przepustowość zawiera preambułę, przerwy i czekanie na
+        # NACK, więc jest zawsze niższa od nominalnej - porównujemy ją tylko, gdy zmierzone
+        # są wszystkie protokoły, a wcześniej kolejność wyznacza sama nominalna
+        if all(p in self.throughput for p in self.protocols):
+            rate = self.throughput
+        else:
+            rate = NOMINAL_RATE
+        return sorted(self.protocols, key=lambda p: (-rate.get(p, 0), self.protocols.index(p)))
+
+    def decide(self):
+        # -> (protokół, czy to próba szybszego); bez zmiany stanu
+        ranked = self.ranked()
+        for i, protocol in enumerate(ranked):
+            if self.success_rate(protocol) >= self.min_success:
+                if i > 0 and self.since_probe >= self.probe_every:
+                    # Próba o stopień szybciej - może warunki się poprawiły
+                    return ranked[i - 1], True
+                return protocol, False
+        return ranked[-1], False  # nic nie działa dobrze - najwolniejszy, najodporniejszy
+
+    def peek(self):
+        with self.lock:
+            return self.decide()[0]
+
+    def choose(self):
+        with self.lock:
+            protocol, probe = self.decide()
+            if probe:
+                self.since_probe = 0
+                self.results[protocol].clear()
+            return protocol
+
+    def record_fixture(self, protocol, path, expected, timeout=10.0):
+        # Ocena protokołu na nagraniu (WAV z nadaną wiadomością) zamiast prawdziwego łącza
+        from gglink import AudioEngine, FileSource
+        from ggframe import Reassembler
+        from ggcodec import decode_payload
+        source = FileSource(path)
+        engine = AudioEngine(source)
+        inbox = engine.subscribe("ocena")
+        try:
+            source.finished.wait(timeout)
+            deadline = time.time() + timeout
+            while engine.ring.read_pos < engine.ring.write_pos and time.time() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.05)
+        finally:
+            engine.unsubscribe("ocena")
+        reassembler = Reassembler()
+        decoded = []
+        while not inbox.empty():
+            message = reassembler.feed(inbox.get())
+            if message:
+                decoded.append(decode_payload(message))
+        success = expected in decoded
+        # Czas nadawania = długość nagrania, niezależnie od tego, jak szybko je przetworzyliśmy
+        self.record(protocol, success, len(source.data) / source.samplerate, len(expected.encode("utf-8")))
+        return success
@@ -0,0 +1,198 @@
+import sys
+import time
+import logging
+import threading
+from queue import Queue
+import numpy as np
+from gglink import AudioEngine, send_via_ggwave, receive_via_ggwave, stop_receivers
+
+class BusSource:
+    # Źródło dla AudioEngine podłączone do wirtualnej magistrali zamiast karty dźwiękowej
+    lossless = True
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.samplerate = bus.samplerate
+        self.blocksize = bus.blocksize
+        self.callback = None
+
+    def start(self, callback):
+        self.callback = callback
+        self.bus.attach(self)
+
+    def stop(self):
+        self.bus.detach(self)
+        self.callback = None
+
+    def deliver(self, block):
+        # Pełny bufor silnika - magistrala czeka (jak FileSource), nic nie ginie po drodze
+        while True:
+            callback = self.callback
+            if callback is None or callback(block.reshape(-1, 1), self.blocksize, None, None) is not False:
+                return
+            time.sleep(0.0005)
+
+class VirtualAudioBus:
+    """Wirtualne medium audio w pamięci procesu, bez głośników i mikrofonów.
+
+    send_via_ggwave wrzuca tu próbki float32, a każde podłączone źródło (silnik
+    odbiorców) dostaje je od razu - szybciej niż w czasie rzeczywistym. Można
+    dodać szum (odchylenie standardowe próbek) i opóźnienie (sekundy ciszy).
+    """
+
+    def __init__(self, samplerate=48000, blocksize=1024, noise=0.0, latency=0.0, tail=0.3, seed=0):
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.noise = noise
+        self.latency = latency
+        self.tail = tail  # cisza po nadaniu, żeby dekoder domknął wiadomość
+        self.rng = np.random.default_rng(seed)
+        self.sources = []
+        self.lock = threading.Lock()
+        self.transmitted = 0
+
+    def source(self):
+        return BusSource(self)
+
+    def attach(self, source):
+        with self.lock:
+            self.sources.append(source)
+
+    def detach(self, source):
+        with self.lock:
+            if source in self.sources:
+                self.sources.remove(source)
+
+    def signal(self, samples):
+        parts = [
+            np.zeros(int(self.latency * self.samplerate), dtype=np.float32),
+            np.asarray(samples, dtype=np.float32),
+            np.zeros(int(self.tail * self.samplerate), dtype=np.float32),
+        ]
+        signal = np.concatenate(parts)
+        padding = -len(signal) % self.blocksize
+        return np.pad(signal, (0, padding)).reshape(-1, self.blocksize)
+
+    def transmit(self, samples):
+        blocks = self.signal(samples)
+        with self.lock:
+            sources = list(self.sources)
+            if self.noise:
+                blocks = blocks + self.rng.normal(0.0, self.noise, blocks.shape).astype(np.float32)
+            self.transmitted += 1
+        for block in blocks:
+            for source in sources:
+                source.deliver(block)
+
+class MixingBus(VirtualAudioBus):
+    """Magistrala, na której nadania z kilku wątków naraz się sumują - jak kilka głośników w pokoju.
+
+    transmit() dopisuje sygnał do aktywnych i czeka, aż wybrzmi; wątek miksera
+    co blok dodaje kolejne bloki wszystkich aktywnych sygnałów i rozsyła sumę.
+    blocks_mixed liczy czas nadawania (antenowy), niezależny od szybkości procesora.
+    realtime=True - blok co blocksize/samplerate sekund, jak z głośnika; bez tego krótkie
+    nadania z różnych wątków rzadko się spotykają, bo każde kończy się w milisekundy.
+    """
+
+    def __init__(self, *args, realtime=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.realtime = realtime
+        self.pending = threading.Condition(self.lock)
+        self.active = []  # [bloki, pozycja, zdarzenie końca]
+        self.blocks_mixed = 0
+        self.max_overlap = 0
+        self.mixer = threading.Thread(target=self.mix_loop, daemon=True)
+        self.mixer.start()
+
+    def transmit(self, samples):
+        done = threading.Event()
+        blocks = self.signal(samples)
+        with self.pending:
+            self.active.append([blocks, 0, done])
+            self.transmitted += 1
+            self.pending.notify()
+        done.wait()
+
+    def airtime(self):
+        return self.blocks_mixed * self.blocksize / self.samplerate
+
+    def mix_loop(self):
+        while True:
+            with self.pending:
+                while not self.active:
+                    self.pending.wait()
+                mixed = np.zeros(self.blocksize, dtype=np.float32)
+                for entry in self.active:
+                    mixed += entry[0][entry[1]]
+                    entry[1] += 1
+                self.max_overlap = max(self.max_overlap, len(self.active))
+                finished = [entry for entry in self.active if entry[1] >= len(entry[0])]
+                self.active = [entry for entry in self.active if entry[1] < len(entry[0])]
+                if self.noise:
+                    mixed += self.rng.normal(0.0, self.noise, self.blocksize).astype(np.float32)
+                self.blocks_mixed += 1
+                sources = list(self.sources)
+            for source in sources:
+                source.deliver(mixed)
+            for entry in finished:
+                entry[2].set()
+            if self.realtime:
+                time.sleep(self.blocksize / self.samplerate)
+
+def benchmark(n_bots=24, n_messages=20, noise=0.0, latency=0.0, protocolId=2):
+    # Boty na zmianę nadają do reszty; liczymy skuteczność dekodowania i wiadomości/s
+    bus = VirtualAudioBus(noise=noise, latency=latency)
+    engine = AudioEngine(bus.source())
+    names = [f"bot{i}" for i in range(n_bots)]
+    deliveries = successes = 0
+    start = time.time()
+    for k in range(n_messages):
+        sender = names[k % n_bots]
+        text = f"{sender}: wiadomość {k}"
+        result_queue = Queue()
+        stop_event = threading.Event()
+        threads = []
+        ready_events = []
+        done_events = []
+        for name in names:
+            if name == sender:
+                continue
+            ready_event = threading.Event()
+            done_event = threading.Event()
+            ready_events.append(ready_event)
+            done_events.append(done_event)
+            thread = threading.Thread(
+                target=receive_via_ggwave,
+                args=(result_queue, stop_event, name, 5.0),
+                kwargs={"engine": engine, "ready_event": ready_event, "done_event": done_event}
+            )
+            threads.append(thread)
+            thread.start()
+        for ready_event in ready_events:
+            ready_event.wait(timeout=2.0)
+        send_via_ggwave(text, protocolId, engine=engine, resend_rounds=0, bus=bus)
+        deadline = time.time() + 2.0
+        for done_event in done_events:
+            done_event.wait(timeout=max(deadline - time.time(), 0))
+        stop_receivers(stop_event, engine)
+        for thread in threads:
+            thread.join()
+        while not result_queue.empty():
+            _, decoded = result_queue.get()
+            deliveries += 1
+            successes += decoded == text
+    elapsed = time.time() - start
+    logging.info(f"🚌 {n_bots} botów, {n_messages} wiadomości, szum {noise}, opóźnienie {latency}s: "
+                 f"skuteczność {successes / max(deliveries, 1):.0%}, {n_messages / elapsed:.2f} wiadomości/s")
+    logging.info(f"🚌 Metryki silnika: {engine.metrics()}")
+    return successes / max(deliveries, 1), n_messages / elapsed
+
+if __name__ == "__main__":
+    # python ggbus.py [liczba_botów] [liczba_wiadomości] [szum]
+    logging.getLogger().setLevel(logging.INFO)
+    args = sys.argv[1:]
+    benchmark(
+        n_bots=int(args[0]) if len(args) > 0 else 24,
+        n_messages=int(args[1]) if len(args) > 1 else 20,
+        noise=float(args[2]) if len(args) > 2 else 0.0,
+    )
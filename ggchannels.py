@@ -0,0 +1,153 @@
+import sys
+import time
+import logging
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from queue import Queue
+import ggwave
+from ggadapt import AUDIBLE, ULTRASOUND, LinkQualityEstimator
+from gglink import AudioEngine, send_via_ggwave, receive_via_ggwave, stop_receivers
+
+# Kanał = rodzina protokołów GGWave i pasmo, w którym leżą jej tony. Pasma się nie
+# nakładają, więc kilka par botów może nadawać naraz, a odbiorca filtruje swoje.
+# Protokoły DT zajmują to samo pasmo co słyszalne, więc nie dają osobnego kanału.
+Channel = namedtuple("Channel", "name protocols band")
+CHANNELS = (
+    Channel("audible", AUDIBLE, (1500.0, 7000.0)),
+    Channel("ultrasound", ULTRASOUND, (14500.0, 20000.0)),
+)
+
+def open_channels(make_source, channels=CHANNELS):
+    # Silnik na kanał: własne źródło, filtr pasmowy i własna instancja ggwave
+    # (ggwave ma limit instancji, więc kanałów jest tyle, ile pasm - nie tyle, ile par)
+    engines = {}
+    for channel in channels:
+        engines[channel.name] = AudioEngine(make_source(), band=channel.band, instance=ggwave.init(),
+                                            protocol=channel.protocols[-1])
+    return engines
+
+class ChannelScheduler:
+    """Przydziela równoległym parom botów wolne kanały GGWave.
+
+    Para dostaje kanał na czas jednej wymiany; gdy wszystkie są zajęte, czeka
+    na pierwszy zwolniony. Każdy kanał ma własną ocenę jakości łącza, więc
+    protokół wybierany jest w obrębie jego rodziny.
+    """
+
+    def __init__(self, channels=CHANNELS):
+        self.channels = tuple(channels)
+        self.free = list(self.channels)
+        self.condition = threading.Condition()
+        self.assigned = {}  # para -> kanał
+        self.quality = {channel.name: LinkQualityEstimator(channel.protocols) for channel in self.channels}
+        self.waits = 0
+
+    def acquire(self, pair, timeout=None):
+        with self.condition:
+            if not self.free:
+                self.waits += 1
+            if not self.condition.wait_for(lambda: self.free, timeout):
+                return None
+            channel = self.free.pop(0)
+            self.assigned[pair] = channel
+            logging.debug(f"[GGWave] Para {pair} dostaje kanał {channel.name}")
+            return channel
+
+    def release(self, pair):
+        with self.condition:
+            channel = self.assigned.pop(pair, None)
+            if channel is None:
+                return
+            # Kolejność jak w channels - najpierw kanał słyszalny (najlepiej sprawdzony)
+            self.free.append(channel)
+            self.free.sort(key=self.channels.index)
+            self.condition.notify()
+
+    @contextmanager
+    def channel(self, pair, timeout=None):
+        channel = self.acquire(pair, timeout)
+        if channel is None:
+            raise TimeoutError(f"Brak wolnego kanału GGWave dla pary {pair}")
+        try:
+            yield channel
+        finally:
+            self.release(pair)
+
+def exchange(sender, receiver, message, scheduler, engines, timeout=10.0):
+    # Jedna wiadomość nadawca -> odbiorca na przydzielonym kanale; -> (kanał, odebrany tekst)
+    with scheduler.channel((sender, receiver)) as channel:
+        engine = engines[channel.name]
+        quality = scheduler.quality[channel.name]
+        protocol = quality.choose()
+        result_queue = Queue()
+        stop_event = threading.Event()
+        ready_event = threading.Event()
+        done_event = threading.Event()
+        thread = threading.Thread(
+            target=receive_via_ggwave,
+            args=(result_queue, stop_event, receiver, timeout),
+            kwargs={"engine": engine, "nack": True, "ready_event": ready_event, "done_event": done_event}
+        )
+        thread.start()
+        ready_event.wait(timeout=2.0)
+        start_time = time.time()
+        send_via_ggwave(message, protocol, engine=engine, delivered=done_event)
+        done_event.wait(timeout=timeout)
+        stop_receivers(stop_event, engine)
+        thread.join()
+        _, decoded = result_queue.get()
+        quality.record(protocol, decoded == message, time.time() - start_time, len(message.encode("utf-8")))
+        return channel, decoded
+
+def benchmark(n_pairs=4, n_messages=4, noise=0.0, realtime=True):
+    # Te same rozmowy par botów na jednym kanale i na wszystkich naraz; przepustowość
+    # w bitach na sekundę czasu nadawania (miksowana magistrala), a nie czasu procesora.
+    # Bez realtime nadania prawie się nie nakładają, więc oba warianty wychodzą podobnie
+    from ggbus import MixingBus
+    bus = MixingBus(noise=noise, realtime=realtime)
+    engines = open_channels(bus.source)
+    results = {}
+    for label, channels in (("1 kanał", CHANNELS[:1]), (f"{len(CHANNELS)} kanały", CHANNELS)):
+        scheduler = ChannelScheduler(channels)
+        delivered = []
+        lock = threading.Lock()
+
+        def talk(pair):
+            sender, receiver = f"bot{2 * pair}", f"bot{2 * pair + 1}"
+            for k in range(n_messages):
+                text = f"{sender} do {receiver}: wiadomość {k}"
+                _, decoded = exchange(sender, receiver, text, scheduler, engines)
+                with lock:
+                    delivered.append((text, decoded))
+
+        start_blocks = bus.blocks_mixed
+        start_time = time.time()
+        threads = [threading.Thread(target=talk, args=(pair,)) for pair in range(n_pairs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.time() - start_time
+        airtime = (bus.blocks_mixed - start_blocks) * bus.blocksize / bus.samplerate
+        bits = sum(len(text.encode("utf-8")) * 8 for text, decoded in delivered if decoded == text)
+        successes = sum(decoded == text for text, decoded in delivered)
+        results[label] = bits / airtime if airtime else 0.0
+        logging.info(f"📻 {label}: {n_pairs} par, skuteczność {successes}/{len(delivered)}, "
+                     f"{results[label]:.1f} bit/s czasu nadawania ({airtime:.1f}s), {elapsed:.1f}s obliczeń, "
+                     f"czekania na kanał: {scheduler.waits}")
+    logging.info(f"📻 Maksymalnie nadań naraz: {bus.max_overlap}")
+    for engine in engines.values():
+        ggwave.free(engine.instance)
+    return results
+
+if __name__ == "__main__":
+    # python ggchannels.py [liczba_par] [wiadomości_na_parę] [szum] [czas_rzeczywisty 0/1]
+    logging.getLogger().setLevel(logging.INFO)
+    args = sys.argv[1:]
+    benchmark(
+        n_pairs=int(args[0]) if len(args) > 0 else 4,
+        n_messages=int(args[1]) if len(args) > 1 else 4,
+        noise=float(args[2]) if len(args) > 2 else 0.0,
+        realtime=args[3] != "0" if len(args) > 3 else True,
+    )
@@ -0,0 +1,80 @@
+import sys
+import zlib
+import base64
+import logging
+
+# Zwarte kodowanie treści dla łącza GGWave: deflate ze wspólnym, stałym słownikiem
+# polskich słów (nadawca i odbiorca mają ten sam), a potem base85, bo ggwave
+# przyjmuje tylko tekst. Znacznik "~Z" odróżnia to od zwykłego tekstu.
+MARKER = "~Z"
+
+# Najczęstsze fragmenty trzymamy na końcu - deflate najtaniej odwołuje się do bliskich
+POLISH_DICT = (
+    "przez bardzo jeszcze tylko może być było będzie mieć mam masz ma mamy macie mają "
+    "chcę chcesz chce wiem wiesz myślę myślisz mówię mówisz mówi rozumiem dziękuję proszę "
+    "przepraszam oczywiście naprawdę właśnie teraz dzisiaj jutro wczoraj zawsze nigdy czasem "
+    "dlaczego dlatego ponieważ jednak również także który która które którzy jakiś jakie "
+    "dobrze dobry dobra dobre świetnie super fajnie ciekawe ciekawy interesujące pomysł "
+    "rozmowa rozmawiać pytanie odpowiedź historia książka muzyka pogoda świat życie człowiek "
+    "ludzie czas dzień rok praca dom miasto kraj Polska polski polsku język słowo bot boty "
+    "Jesteś jestem jest są się nie tak też już jak ale czy co to na do w z że i a o od po za "
+    "dla mnie tobie ciebie nas was ich jego jej mój moja moje twój twoja twoje nasz wasz "
+    "Cześć, co słychać? Dzień dobry! Witaj! Do widzenia! Miło cię poznać. Jak się masz? "
+)
+ZDICT = POLISH_DICT.encode("utf-8")
+
+def deflate(data):
+    compressor = zlib.compressobj(level=9, wbits=-15, zdict=ZDICT)
+    return compressor.compress(data) + compressor.flush()
+
+def inflate(data):
+    decompressor = zlib.decompressobj(wbits=-15, zdict=ZDICT)
+    return decompressor.decompress(data) + decompressor.flush()
+
+def encode_payload(text):
+    # Wersja spakowana tylko wtedy, gdy faktycznie jest krótsza od surowego UTF-8
+    packed = MARKER + base64.b85encode(deflate(text.encode("utf-8"))).decode("ascii")
+    if len(packed) < len(text.encode("utf-8")) or text.startswith(MARKER):
+        return packed
+    return text
+
+def decode_payload(payload):
+    # -> tekst albo None; surowy tekst nigdy nie zaczyna się od MARKER (encode_payload
+    # wtedy zawsze pakuje), więc nieudane rozpakowanie to uszkodzona wiadomość
+    if not payload.startswith(MARKER):
+        return payload
+    try:
+        return inflate(base64.b85decode(payload[len(MARKER):])).decode("utf-8")
+    except Exception as e:
+        logging.debug(f"Błąd rozpakowania wiadomości GGWave: {e}")
+        return None
+
+def benchmark(messages, protocolId=1, volume=60):
+    # Surowy tekst vs. spakowany: bajty, ramki i (jeśli jest ggwave) czas nadawania
+    from ggframe import frame_message
+    try:
+        from gglink import frames_audio
+    except Exception:
+        frames_audio = None
+    totals = {"raw": [0, 0.0], "packed": [0, 0.0]}
+    for text in messages:
+        for variant, payload in (("raw", text), ("packed", encode_payload(text))):
+            _, frames = frame_message(payload)
+            size = sum(len(frame.encode("utf-8")) for frame in frames)
+            airtime = len(frames_audio(frames, protocolId, volume)) / 48000 if frames_audio else 0.0
+            totals[variant][0] += size
+            totals[variant][1] += airtime
+            logging.info(f"[{variant}] {size} B, {len(frames)} ramek, {airtime:.2f}s: {text[:40]}")
+    for variant, (size, airtime) in totals.items():
+        rate = f", {sum(len(t.encode('utf-8')) for t in messages) / airtime:.1f} B/s treści" if airtime else ""
+        logging.info(f"[{variant}] razem {size} B, {airtime:.2f}s{rate}")
+
+if __name__ == "__main__":
+    # python ggcodec.py ["wiadomość" ...]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    benchmark(sys.argv[1:] or [
+        "Cześć, co słychać?",
+        "Jestem pisarzem i bardzo lubię rozmawiać o książkach, historii i muzyce.",
+        "Dzień dobry! Dzisiaj jest piękna pogoda, może pójdziemy na spacer po mieście?",
+        "Oczywiście, że tak. Myślę, że to naprawdę ciekawy pomysł, ale jeszcze nie wiem, czy mam czas.",
+    ])
@@ -0,0 +1,128 @@
+import re
+import time
+import zlib
+
+# Ramki dla łącza GGWave (jedna wiadomość GGWave = jedna ramka):
+#   ~D<id><nr><ile><crc>|<fragment>   - fragment danych (pola w hex)
+#   ~N<id><nr><nr>...                 - prośba o ponowne wysłanie brakujących fragmentów
+# Krótkie wiadomości idą bez ramki, tak jak dawniej.
+MAX_FRAME_BYTES = 100
+HEADER = "~D{:02x}{:02x}{:02x}{:04x}|"
+HEADER_BYTES = len(HEADER.format(0, 0, 0, 0))
+DATA_RE = re.compile(r"^~D([0-9a-f]{2})([0-9a-f]{2})([0-9a-f]{2})([0-9a-f]{4})\|(.*)$", re.S)
+NACK_RE = re.compile(r"^~N([0-9a-f]{2})((?:[0-9a-f]{2})+)$")
+
+def checksum(text):
+    return zlib.crc32(text.encode("utf-8")) & 0xFFFF
+
+def split_utf8(text, max_bytes):
+    # Dzieli po znakach, pilnując limitu bajtów - polskie znaki nie są rozcinane
+    chunks = []
+    current = ""
+    size = 0
+    for char in text:
+        char_size = len(char.encode("utf-8"))
+        if size + char_size > max_bytes and current:
+            chunks.append(current)
+            current, size = "", 0
+        current += char
+        size += char_size
+    if current:
+        chunks.append(current)
+    return chunks
+
+def needs_framing(message):
+    # Tekst wyglądający jak nagłówek ramki też pakujemy, żeby odbiorca go nie pomylił
+    return len(message.encode("utf-8")) > MAX_FRAME_BYTES or message.startswith(("~D", "~N"))
+
+def frame_message(message, message_id=None):
+    # -> (id, [ramki]); id None, gdy wiadomość mieści się w jednej ramce bez nagłówka
+    if not needs_framing(message):
+        return None, [message]
+    if message_id is None:
+        # Id z treści - ta sama wiadomość daje te same ramki (i trafia w cache fal)
+        message_id = checksum(message) & 0xFF
+    chunks = split_utf8(message, MAX_FRAME_BYTES - HEADER_BYTES)
+    if len(chunks) > 255:
+        raise ValueError(f"Wiadomość zbyt długa na łącze GGWave ({len(chunks)} fragmentów)")
+    frames = [HEADER.format(message_id, seq, len(chunks), checksum(chunk)) + chunk for seq, chunk in enumerate(chunks)]
+    return message_id, frames
+
+def make_nack(message_id, missing):
+    return f"~N{message_id:02x}" + "".join(f"{seq:02x}" for seq in missing)
+
+def parse_nack(text):
+    # -> (id, [numery fragmentów]) albo None
+    match = NACK_RE.match(text)
+    if not match:
+        return None
+    seqs = match.group(2)
+    return int(match.group(1), 16), [int(seqs[i:i + 2], 16) for i in range(0, len(seqs), 2)]
+
+class Reassembler:
+    """Składa wiadomości z ramek; ramki z błędną sumą kontrolną są pomijane (wrócą w ponownym wysłaniu).
+
+    Tekst bez ramki to zwykła krótka wiadomość - chyba że wygląda jak nagłówek ramki
+    albo właśnie składamy wiadomość z ramek (do pending_hold sekund od ostatniej).
+    Wtedy to przekłamanie dekodera, a nie wiadomość, i jest pomijane.
+    """
+
+    def __init__(self, pending_hold=10.0):
+        self.messages = {}  # id -> {"total", "chunks", "started", "updated", "nacks"}
+        self.last_throughput = None  # B/s ostatniej złożonej wiadomości
+        self.pending_hold = pending_hold
+        self.rejected = 0
+
+    def pending(self):
+        now = time.time()
+        return any(now - state["updated"] < self.pending_hold for state in self.messages.values())
+
+    def feed(self, text):
+        # -> pełna wiadomość albo None
+        if parse_nack(text) is not None:
+            return None
+        match = DATA_RE.match(text)
+        if not match:
+            if text.startswith(("~D", "~N")) or self.pending():
+                self.rejected += 1
+                return None
+            return text
+        message_id, seq, total, crc = (int(match.group(i), 16) for i in range(1, 5))
+        chunk = match.group(5)
+        if checksum(chunk) != crc or seq >= total:
+            return None
+        now = time.time()
+        state = self.messages.setdefault(message_id, {"total": total, "chunks": {}, "started": now, "updated": now, "nacks": 0})
+        state["chunks"][seq] = chunk
+        state["updated"] = now
+        if len(state["chunks"]) == state["total"]:
+            del self.messages[message_id]
+            message = "".join(state["chunks"][i] for i in range(state["total"]))
+            elapsed = now - state["started"]
+            self.last_throughput = len(message.encode("utf-8")) / elapsed if elapsed > 0 else None
+            return message
+        return None
+
+    def missing(self, message_id):
+        state = self.messages.get(message_id)
+        if not state:
+            return []
+        return [seq for seq in range(state["total"]) if seq not in state["chunks"]]
+
+    def stalled(self, gap):
+        # Niepełne wiadomości, do których od `gap` sekund nic nie doszło
+        now = time.time()
+        return [message_id for message_id, state in self.messages.items() if now - state["updated"] > gap]
+
+    def next_stall(self, gap):
+        # Najbliższa chwila, w której któraś niepełna wiadomość uzna się za utkniętą
+        if not self.messages:
+            return None
+        return min(state["updated"] for state in self.messages.values()) + gap
+
+    def mark_nacked(self, message_id):
+        # -> ile razy już proszono o brakujące fragmenty tej wiadomości
+        state = self.messages[message_id]
+        state["updated"] = time.time()
+        state["nacks"] += 1
+        return state["nacks"]
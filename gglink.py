@@ -5,7 +5,20 @@ import numpy as np
 import ggwave
 import time
 import threading
-from queue import Queue
+import wave
+import functools
+from queue import Queue, Empty
+from ggframe import frame_message, make_nack, parse_nack, Reassembler
+from ggcodec import encode_payload, decode_payload
+from ggadapt import LinkQualityEstimator
+import playback
+import os
+
+# Pakowanie treści (deflate + słownik polski) przed nadaniem; odbiorca rozpakowuje zawsze
+COMPRESS = os.getenv("GGWAVE_COMPRESS", "1") == "1"
+
+# Wspólna ocena jakości łącza - wybiera protokół, gdy protocolId nie jest podany
+link_quality = LinkQualityEstimator()
 
 try:
     ggwave_instance = ggwave.init()
@@ -14,105 +27,451 @@ except Exception as e:
     logging.error(f"❌ Błąd inicjalizacji GGWave: {e}")
     ggwave_instance = None
 
-def send_via_ggwave(message: str, protocolId: int = 1, volume: int = 60):
+@functools.lru_cache(maxsize=64)
+def encode_waveform(message: str, protocolId: int = 1, volume: int = 60):
+    # Gotowe próbki dla (wiadomość, protokół, głośność) - powtarzane wiadomości i stałe
+    # komunikaty nie są kodowane ponownie. Tablica jest tylko do odczytu (współdzielona).
+    waveform = ggwave.encode(message, protocolId=protocolId, volume=volume)
+    return np.frombuffer(waveform, dtype=np.float32)
+
+FRAME_GAP = np.zeros(int(0.1 * 48000), dtype=np.float32)  # cisza między ramkami
+
+def frames_audio(frames, protocolId: int = 1, volume: int = 60):
+    if len(frames) == 1:
+        return encode_waveform(frames[0], protocolId, volume)
+    parts = []
+    for frame in frames:
+        parts.extend((encode_waveform(frame, protocolId, volume), FRAME_GAP))
+    return np.concatenate(parts)
+
+def link_payload(message: str, compress: bool = None):
+    if compress is None:
+        compress = COMPRESS
+    return encode_payload(message) if compress else message
+
+def prepare_ggwave(message: str, protocolId: int = None, volume: int = 60, compress: bool = None):
+    # Można wywołać wcześniej (np. gdy odbiorcy dopiero startują), żeby wysyłanie ruszyło od razu
+    if not message:
+        return None
+    if protocolId is None:
+        protocolId = link_quality.choose()
+
+    payload = link_payload(message, compress)
+    if payload is not message:
+        logging.debug(f"Spakowano wiadomość: {len(message.encode('utf-8'))} -> {len(payload)} bajtów")
+
+    # limit GGWave - dłuższe wiadomości idą w kilku ramkach
+    message_id, frames = frame_message(payload)
+    if message_id is not None:
+        logging.info(f"Wiadomość {len(payload.encode('utf-8'))} bajtów -> {len(frames)} ramek GGWave (id {message_id:02x})")
+    return frames_audio(frames, protocolId, volume)
+
+def play_audio(audio, bus=None):
+    # bus - wirtualne medium (ggbus.VirtualAudioBus) zamiast głośnika
+    if bus is not None:
+        bus.transmit(audio)
+        return
+    with playback.playing():
+        sd.play(audio, samplerate=48000)
+        sd.wait()
+
+def wait_for_nack(inbox: Queue, message_id: int, timeout: float, delivered: threading.Event = None):
+    # delivered - odbiorca już złożył wiadomość, więc prośby o ramki nie będzie
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if delivered is not None and delivered.is_set():
+            break
+        wait = max(deadline - time.time(), 0.01)
+        try:
+            nack = parse_nack(inbox.get(timeout=min(wait, 0.05) if delivered is not None else wait) or "")
+        except Empty:
+            if delivered is None:
+                break
+            continue
+        if nack and nack[0] == message_id:
+            return nack[1]
+    return []
+
+def send_via_ggwave(message: str, protocolId: int = None, volume: int = 60, resend_rounds: int = 2,
+                    nack_timeout: float = 3.0, engine=None, compress: bool = None, delivered: threading.Event = None,
+                    bus=None):
  
     try:
         if not message:
             logging.warning("Pusta wiadomość, pomijam wysyłanie.")
             return None
 
-        # limit GGWave
-        if len(message.encode('utf-8')) > 100:
-            logging.warning(f"Wiadomość zbyt długa ({len(message.encode('utf-8'))} bajtów), obcinam do 100 znaków.")
-            message = message[:100]
+        if protocolId is None:
+            protocolId = link_quality.choose()
+        start_time = time.time()
+        audio = prepare_ggwave(message, protocolId, volume, compress)
+        logging.debug(f"Rozmiar waveform: {audio.nbytes} bajtów (cache: {encode_waveform.cache_info()})")
+        engine = engine or get_engine()
+        if bus is None:
+            bus = getattr(engine.source, "bus", None)
+        play_audio(audio, bus)
 
-        waveform = ggwave.encode(message, protocolId=protocolId, volume=volume)
-        audio = np.frombuffer(waveform, dtype=np.float32)
-        logging.debug(f"Rozmiar waveform: {len(waveform)} bajtów")
-        sd.play(audio, samplerate=48000)
-        sd.wait()
-        logging.info(f"📡 [GGWave] Wysłano: {message}")
-        time.sleep(0.3)  
-        return waveform
+        # Wiadomość w ramkach: odbiorca może poprosić o brakujące fragmenty
+        message_id, frames = frame_message(link_payload(message, compress))
+        if message_id is not None and resend_rounds:
+            listener_name = f"nadawca-{message_id:02x}"
+            inbox = engine.subscribe(listener_name)
+            try:
+                for _ in range(resend_rounds):
+                    missing = [seq for seq in wait_for_nack(inbox, message_id, nack_timeout, delivered) if seq < len(frames)]
+                    if not missing:
+                        break
+                    logging.info(f"🔁 [GGWave] Ponawiam ramki {missing} wiadomości {message_id:02x}")
+                    play_audio(frames_audio([frames[seq] for seq in missing], protocolId, volume), bus)
+            finally:
+                engine.unsubscribe(listener_name)
+
+        elapsed = time.time() - start_time
+        size = len(message.encode('utf-8'))
+        logging.info(f"📡 [GGWave] Wysłano protokołem {protocolId}: {message} ({size} B w {elapsed:.1f}s, {size / elapsed:.1f} B/s)")
+        return audio
     except Exception as e:
         logging.error(f"Błąd przy wysyłaniu GGWave: {e}")
         return None
 
-def receive_via_ggwave(queue: Queue, stop_event: threading.Event, bot_name: str, silence_timeout: float = 15.0):
+class SoundDeviceSource:
+    # Prawdziwe wejście audio (karta dźwiękowa)
+    def __init__(self, device=None, samplerate=48000, blocksize=1024):
+        self.device = device
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.stream = None
+
+    def start(self, callback):
+        self.stream = sd.InputStream(
+            callback=callback,
+            channels=1,
+            samplerate=self.samplerate,
+            dtype='float32',
+            blocksize=self.blocksize,
+            latency='low',
+            device=self.device if self.device is not None else sd.default.device[0]
+        )
+        self.stream.start()
+
+    def stop(self):
+        if self.stream is not None:
+            self.stream.stop()
+            self.stream.close()
+            self.stream = None
+
+class FileSource:
+    # Nagranie (plik WAV albo tablica float32) podawane blokami jak z karty dźwiękowej - testy bez sprzętu
+    lossless = True  # przy pełnym buforze czeka i podaje blok ponownie, nic nie ginie
+
+    def __init__(self, data, samplerate=48000, blocksize=1024, realtime=False):
+        if isinstance(data, str):
+            data, samplerate = load_wav(data)
+        self.data = np.asarray(data, dtype=np.float32).reshape(-1)
+        self.samplerate = samplerate
+        self.blocksize = blocksize
+        self.realtime = realtime
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()  # całe nagranie zostało podane
+        self.thread = None
+
+    def start(self, callback):
+        self.stop_event.clear()
+        self.finished.clear()
+        self.thread = threading.Thread(target=self.run, args=(callback,), daemon=True)
+        self.thread.start()
+
+    def run(self, callback):
+        for start in range(0, len(self.data), self.blocksize):
+            if self.stop_event.is_set():
+                break
+            block = self.data[start:start + self.blocksize]
+            if len(block) < self.blocksize:
+                block = np.pad(block, (0, self.blocksize - len(block)))
+            # Pełny bufor silnika (False) - plik, w przeciwieństwie do karty dźwiękowej, może poczekać
+            while callback(block.reshape(-1, 1), self.blocksize, None, None) is False and not self.stop_event.is_set():
+                time.sleep(0.001)
+            if self.realtime:
+                time.sleep(self.blocksize / self.samplerate)
+        self.finished.set()
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None and self.thread is not threading.current_thread():
+            self.thread.join(timeout=1.0)
+        self.thread = None
+
+def load_wav(path):
+    with wave.open(path, "rb") as wf:
+        frames = wf.readframes(wf.getnframes())
+        samplerate = wf.getframerate()
+        width = wf.getsampwidth()
+        channels = wf.getnchannels()
+    if width == 4:
+        samples = np.frombuffer(frames, dtype=np.float32)
+    else:
+        samples = np.frombuffer(frames, dtype=np.int16).astype(np.float32) / 32768.0
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return samples, samplerate
+
+class RingBuffer:
+    """Bufor cykliczny bloków audio dla jednego producenta i jednego konsumenta.
+
+    Bez blokad: callback audio przesuwa tylko write_pos, wątek dekodera tylko
+    read_pos, a pamięć jest zaalokowana z góry.
+    """
+
+    def __init__(self, capacity: int = 96, blocksize: int = 1024):
+        self.capacity = capacity
+        self.blocksize = blocksize
+        self.data = np.zeros((capacity, blocksize), dtype=np.float32)
+        self.write_pos = 0
+        self.read_pos = 0
+
+    def write(self, block) -> bool:
+        # False - bufor pełny; czy blok przepada, decyduje źródło (karta nie poczeka, plik tak)
+        if self.write_pos - self.read_pos >= self.capacity:
+            return False
+        row = self.data[self.write_pos % self.capacity]
+        n = min(len(block), self.blocksize)
+        row[:n] = block[:n]
+        row[n:] = 0.0
+        self.write_pos += 1
+        return True
+
+    def read_batch(self):
+        count = self.write_pos - self.read_pos
+        if count <= 0:
+            return None
+        indices = np.arange(self.read_pos, self.read_pos + count) % self.capacity
+        batch = self.data[indices]  # kopia - producent może już nadpisywać
+        self.read_pos += count
+        return batch
+
+class AudioEngine:
+    """Jeden strumień wejściowy i jeden dekoder GGWave dla wszystkich słuchających botów.
+
+    Zdekodowane wiadomości trafiają do kolejki każdego zapisanego subskrybenta,
+    więc liczba otwartych urządzeń i koszt dekodowania nie rosną z liczbą botów.
+    Callback audio tylko kopiuje próbki do bufora cyklicznego - pomiar poziomu
+    i ggwave.decode działają w osobnym wątku dekodera.
+    """
+
+    def __init__(self, source=None, ring_blocks: int = 96, band=None, instance=None, protocol: int = 1):
+        self.source = source if source is not None else SoundDeviceSource()
+        self.ring = RingBuffer(ring_blocks, self.source.blocksize)
+        # band=(od Hz, do Hz) - dekodujemy tylko ten kanał, reszta pasma należy do innych par botów
+        self.band = band
+        self.band_mask = None
+        if band is not None:
+            freqs = np.fft.rfftfreq(self.source.blocksize, 1 / self.source.samplerate)
+            self.band_mask = (freqs < band[0]) | (freqs > band[1])
+        self.instance = instance  # własny dekoder ggwave (kanał); None - wspólny ggwave_instance
+        self.protocol = protocol  # protokół odpowiedzi (NACK) mieszczący się w paśmie silnika
+        self.subscribers = {}
+        self.lock = threading.Lock()
+        self.lifecycle_lock = threading.Lock()
+        self.running = False
+        self.decoder = None
+        self.decoder_stop = threading.Event()
+        self.last_activity = 0.0  # ostatni blok z sygnałem powyżej progu
+        self.lossless = getattr(self.source, "lossless", False)
+        self.input_overflows = 0
+        self.ring_overruns = 0  # bloki utracone przy pełnym buforze
+        self.backpressure_waits = 0  # pełny bufor, źródło poczekało i podało blok jeszcze raz
+        self.blocks_decoded = 0
+        self.messages_decoded = 0
+        self.corrupted = 0  # zdekodowane bajty, które nie są poprawnym UTF-8
+        self.max_batch = 0
+
+    def subscribe(self, name: str) -> Queue:
+        inbox = Queue()
+        with self.lifecycle_lock:
+            with self.lock:
+                self.subscribers[name] = inbox
+            if not self.running:
+                self.start()
+        return inbox
+
+    def unsubscribe(self, name: str):
+        with self.lifecycle_lock:
+            with self.lock:
+                self.subscribers.pop(name, None)
+                empty = not self.subscribers
+            if self.running and empty:
+                self.stop()
+
+    def start(self):
+        self.last_activity = time.time()
+        self.ring.read_pos = self.ring.write_pos
+        self.decoder_stop.clear()
+        self.decoder = threading.Thread(target=self.decode_loop, daemon=True)
+        self.decoder.start()
+        self.source.start(self.callback)
+        self.running = True
+        logging.info("🎧 Silnik audio GGWave uruchomiony")
+
+    def stop(self):
+        self.running = False
+        self.source.stop()
+        self.decoder_stop.set()
+        self.decoder.join(timeout=1.0)
+        logging.info(f"🔇 Silnik audio GGWave zatrzymany, metryki: {self.metrics()}")
+
+    def publish(self, text: str):
+        with self.lock:
+            inboxes = list(self.subscribers.values())
+        for inbox in inboxes:
+            inbox.put(text)
+
+    def wake(self):
+        # None w kolejce budzi czekających odbiorców, żeby sprawdzili stop_event
+        self.publish(None)
+
+    def callback(self, indata, frames, time_info, status):
+        # Wątek czasu rzeczywistego: tylko liczniki przepełnień i kopia do bufora
+        if status and status.input_overflow:
+            self.input_overflows += 1
+        written = self.ring.write(indata[:, 0])
+        if not written:
+            if self.lossless:
+                self.backpressure_waits += 1
+            else:
+                self.ring_overruns += 1
+        return written
+
+    def decode_loop(self):
+        idle = self.source.blocksize / self.source.samplerate / 2
+        instance = self.instance if self.instance is not None else ggwave_instance
+        while not self.decoder_stop.is_set():
+            batch = self.ring.read_batch()
+            if batch is None:
+                time.sleep(idle)
+                continue
+            self.max_batch = max(self.max_batch, len(batch))
+            if self.band_mask is not None:
+                # Filtr pasmowy całej paczki jednym FFT - inne kanały nie przeszkadzają dekoderowi
+                spectrum = np.fft.rfft(batch, axis=1)
+                spectrum[:, self.band_mask] = 0
+                batch = np.fft.irfft(spectrum, n=batch.shape[1], axis=1).astype(np.float32)
+            # Poziom całej paczki naraz zamiast bloku po bloku
+            levels = np.abs(batch).max(axis=1)
+            if levels.max() > 0.001:
+                self.last_activity = time.time()
+                logging.debug(f"[GGWave] Poziom audio: {levels.max():.6f} ({len(batch)} bloków)")
+            for block in batch:
+                self.blocks_decoded += 1
+                try:
+                    res = ggwave.decode(instance, block.tobytes())
+                except Exception as e:
+                    logging.debug(f"[GGWave] Błąd dekodera: {e}")
+                    continue
+                if res:
+                    try:
+                        decoded_text = res.decode("utf-8")
+                    except UnicodeDecodeError as e:
+                        # Przekłamane bajty to nie wiadomość - ramka wróci w ponownym wysłaniu
+                        self.corrupted += 1
+                        logging.debug(f"[GGWave] Odrzucono niepoprawne UTF-8: {e}")
+                        continue
+                    self.messages_decoded += 1
+                    logging.info(f"🎯 [GGWave] ZDEKODOWANO: '{decoded_text}'")
+                    self.publish(decoded_text)
+
+    def metrics(self) -> dict:
+        return {
+            "input_overflows": self.input_overflows,
+            "ring_overruns": self.ring_overruns,
+            "backpressure_waits": self.backpressure_waits,
+            "blocks_decoded": self.blocks_decoded,
+            "messages_decoded": self.messages_decoded,
+            "corrupted": self.corrupted,
+            "max_batch": self.max_batch,
+        }
+
+_engine = None
+
+def get_engine() -> AudioEngine:
+    global _engine
+    if _engine is None:
+        _engine = AudioEngine()
+    return _engine
+
+def set_engine(engine: AudioEngine):
+    # Np. AudioEngine(FileSource("nagranie.wav")) zamiast mikrofonu
+    global _engine
+    _engine = engine
+
+def stop_receivers(stop_event: threading.Event, engine: AudioEngine = None):
+    stop_event.set()
+    (engine or get_engine()).wake()
+
+def receive_via_ggwave(queue: Queue, stop_event: threading.Event, bot_name: str, silence_timeout: float = 15.0,
+                       engine: AudioEngine = None, nack: bool = False, frame_gap: float = 1.5, max_nacks: int = 2,
+                       ready_event: threading.Event = None, done_event: threading.Event = None, max_listen: float = 30.0):
+    # nack=True - ten odbiorca prosi nadawcę o brakujące ramki (wystarczy jeden na pokój)
+    # ready_event - ustawiany, gdy strumień jest otwarty; done_event - gdy wiadomość jest zdekodowana
 
     if ggwave_instance is None:
         logging.error("❌ Brak instancji GGWave — nie można odbierać.")
         queue.put((bot_name, None))
+        if done_event is not None:
+            done_event.set()
         return
 
+    engine = engine or get_engine()
+    reassembler = Reassembler()
     decoded = None
-    stream = None
-    last_data_time = time.time()
     start_time = time.time()
 
-    def callback(indata, frames, time_info, status):
-        nonlocal decoded, last_data_time
-        if status:
-            logging.debug(f"[{bot_name}] Status: {status}")
-        if stop_event.is_set():
-            return
-            
-        try:
-            # Sprawdź poziom audio - KLUCZOWE!
-            audio_level = np.max(np.abs(indata))
-            if audio_level > 0.001:  
-                last_data_time = time.time()
-                logging.debug(f"[{bot_name}] Poziom audio: {audio_level:.6f}")
-
-            data_bytes = indata.tobytes()
-            res = ggwave.decode(ggwave_instance, data_bytes)
-            
-            if res:
-                try:
-                    decoded_text = res.decode("utf-8")
-                    logging.info(f"🎯 [{bot_name}] ZDEKODOWANO: '{decoded_text}'")
-                    decoded = decoded_text
-                    queue.put((bot_name, decoded))
-                   
-                    return
-                except Exception as e:
-                    logging.debug(f"[{bot_name}] Błąd dekodowania UTF-8: {e}")
-                    decoded = str(res)
-                    queue.put((bot_name, decoded))
-                    return
-                    
-        except Exception as e:
-            logging.debug(f"[{bot_name}] Błąd w callback: {e}")
-
     try:
         logging.info(f"🎧 {bot_name} nasłuchuje GGWave (timeout: {silence_timeout}s)...")
-        
-        with sd.InputStream(
-            callback=callback, 
-            channels=1, 
-            samplerate=48000, 
-            dtype='float32', 
-            blocksize=1024,  
-            latency='low',
-            device=sd.default.device[0]  
-        ) as stream:
-            
-            while not stop_event.is_set():
-                #cisz a15 s
-                if time.time() - last_data_time > silence_timeout:
-                    logging.info(f"⏰ [{bot_name}] Timeout ciszy ({silence_timeout}s)")
-                    break
-                #szumanie
-                if time.time() - start_time > 30:
-                    logging.info(f"⏰ [{bot_name}] Maksymalny czas nasłuchiwania")
-                    break
-                    
-                time.sleep(0.1)  
-                
+        inbox = engine.subscribe(bot_name)
     except Exception as e:
         logging.error(f"❌ Błąd InputStream dla {bot_name}: {e}")
         queue.put((bot_name, None))
+        if done_event is not None:
+            done_event.set()
         return
+    if ready_event is not None:
+        ready_event.set()
+
+    try:
+        while not stop_event.is_set():
+            # Czekamy na zdarzenie (ramka, pobudka) albo najbliższy termin - bez odpytywania co chwilę
+            now = time.time()
+            deadlines = [max(engine.last_activity, start_time) + silence_timeout, start_time + max_listen]
+            if nack and reassembler.next_stall(frame_gap) is not None:
+                deadlines.append(reassembler.next_stall(frame_gap))
+            try:
+                item = inbox.get(timeout=max(min(deadlines) - now, 0.001))
+            except Empty:
+                item = None
+            if item is not None:
+                message = reassembler.feed(item)
+                decoded = decode_payload(message) if message else None
+                if decoded:
+                    throughput = f" ({reassembler.last_throughput:.1f} B/s)" if reassembler.last_throughput else ""
+                    logging.info(f"🎯 [{bot_name}] ZDEKODOWANO: '{decoded}'{throughput}")
+                    break
+            if nack:
+                for message_id in reassembler.stalled(frame_gap):
+                    if reassembler.mark_nacked(message_id) > max_nacks:
+                        continue
+                    missing = reassembler.missing(message_id)
+                    logging.info(f"🔁 [{bot_name}] Brak ramek {missing} wiadomości {message_id:02x}, proszę o ponowienie")
+                    play_audio(encode_waveform(make_nack(message_id, missing), engine.protocol), getattr(engine.source, "bus", None))
+            #cisz a15 s
+            if time.time() - max(engine.last_activity, start_time) > silence_timeout:
+                logging.info(f"⏰ [{bot_name}] Timeout ciszy ({silence_timeout}s)")
+                break
+            #szumanie
+            if time.time() - start_time > max_listen:
+                logging.info(f"⏰ [{bot_name}] Maksymalny czas nasłuchiwania")
+                break
+    finally:
+        engine.unsubscribe(bot_name)
 
     if decoded:
         logging.info(f"✅ {bot_name} ODEBRAŁ: '{decoded}'")
@@ -120,4 +479,67 @@ def receive_via_ggwave(queue: Queue, stop_event: threading.Event, bot_name: str,
     else:
         logging.info(f"❌ {bot_name} nic nie odebrał")
         queue.put((bot_name, None))
+    if done_event is not None:
+        done_event.set()
+
+def broadcast_exchange(sender: str, receivers, message: str, protocol: int = None, engine: AudioEngine = None,
+                       listener=None, silence_timeout: float = 12.0, ready_timeout: float = 2.0, grace: float = 2.0):
+    # Nadawca -> wszyscy odbiorcy w pokoju; -> [(odbiorca, odebrany tekst)] tych, którzy coś odebrali.
+    # listener - obiekt z pause()/resume() (np. stt.Listener), który zwalnia mikrofon na czas odbioru
+    if protocol is None:
+        protocol = link_quality.choose()
+    # kodowanie fali w tle, zanim odbiorcy się rozgrzeją
+    prepare_thread = threading.Thread(target=prepare_ggwave, args=(message, protocol))
+    prepare_thread.start()
+
+    result_queue = Queue()
+    stop_event = threading.Event()
+    threads = []
+    ready_events = []
+    done_events = []
+    if listener is not None:
+        listener.pause()
+    try:
+        for name in receivers:
+            ready_event = threading.Event()
+            done_event = threading.Event()
+            ready_events.append(ready_event)
+            done_events.append(done_event)
+            thread = threading.Thread(
+                target=receive_via_ggwave,
+                args=(result_queue, stop_event, name, silence_timeout),
+                kwargs={"engine": engine,
+                        "nack": not threads,  # tylko pierwszy odbiorca prosi o brakujące ramki
+                        "ready_event": ready_event, "done_event": done_event}
+            )
+            threads.append(thread)
+            thread.start()
+
+        # nadajemy, gdy tylko wszyscy odbiorcy mają otwarty strumień (zamiast stałej sekundy)
+        for ready_event in ready_events:
+            ready_event.wait(timeout=ready_timeout)
+        prepare_thread.join()
+        send_start = time.time()
+        send_via_ggwave(message, protocol, engine=engine, delivered=done_events[0] if done_events else None)
+        send_time = time.time() - send_start
+        # kończymy, gdy wszyscy odebrali - krótki margines tylko dla spóźnionych ramek
+        deadline = time.time() + grace
+        for done_event in done_events:
+            done_event.wait(timeout=max(deadline - time.time(), 0))
+        stop_receivers(stop_event, engine)
+        for thread in threads:
+            thread.join()
+    finally:
+        if listener is not None:
+            listener.resume()
 
+    received = []
+    while not result_queue.empty():
+        name, decoded = result_queue.get()
+        if decoded:
+            received.append((name, decoded))
+    # wynik wymiany trafia do oceny łącza (wybór protokołu następnym razem)
+    link_quality.record(protocol, any(decoded == message for _, decoded in received),
+                        send_time, len(message.encode("utf-8")))
+    logging.debug(f"[GGWave] {sender} -> {len(received)}/{len(threads)} odbiorców")
+    return received
@@ -1,23 +1,192 @@
+import os
 import logging
 import time
-import random
-from stt import listen
+from stt import get_listener
 from bot import get_response
-from tts import speak
-from gglink import send_via_ggwave, receive_via_ggwave
-import threading
-from queue import Queue
+from tts import speak, synthesize, prepare
+from gglink import prepare_ggwave, link_quality, broadcast_exchange
+from actors import ActorThread, Envelope, BROADCAST, llm_responder
+from cache import normalize_text
+from turns import TurnScheduler, Speculator, interruptible
+from concurrent.futures import ThreadPoolExecutor
 
 import sounddevice as sd
 sd.default.device = (13, 3)  # (input_id, output_id)
 
+# GGWAVE_BUS=1 - boty wymieniają GGWave przez wirtualną magistralę w pamięci, bez głośników
+GGWAVE_BUS = os.getenv("GGWAVE_BUS") == "1"
+if GGWAVE_BUS:
+    from gglink import AudioEngine, set_engine
+    from ggbus import VirtualAudioBus
+    set_engine(AudioEngine(VirtualAudioBus().source()))
+
+# GGWAVE_CHANNELS=1 - kilka par botów rozmawia przez GGWave naraz, każda w swoim paśmie
+# (ggchannels). Nadania muszą się sumować, więc pary idą przez magistralę z mikserem w
+# pamięci: sd.play z kilku wątków na jednej karcie przerywałby się nawzajem.
+GGWAVE_CHANNELS = os.getenv("GGWAVE_CHANNELS") == "1"
+if GGWAVE_CHANNELS:
+    from ggbus import MixingBus
+    from ggchannels import CHANNELS, ChannelScheduler, open_channels, exchange
+    channel_engines = open_channels(MixingBus(realtime=True).source)
+    channel_scheduler = ChannelScheduler()
+
 
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
 
-class Bot:
-    def __init__(self, name, system_prompt):
-        self.name = name
-        self.system_prompt = system_prompt
+executor = ThreadPoolExecutor(max_workers=8)
+
+# Okno dla człowieka przed turą bota zamiast stałych 5 s: liczone od wybrzmienia poprzedniej
+# wypowiedzi (po ogonie echa) i przedłużane, dopóki ktoś mówi
+LISTEN_TIMEOUT = float(os.getenv("TURN_LISTEN_TIMEOUT", "1.0"))
+# Po tylu sekundach bez człowieka boty przechodzą na GGWave (dawniej dwa 5-sekundowe nasłuchy)
+GGWAVE_AFTER = float(os.getenv("GGWAVE_AFTER", "10"))
+# BARGE_IN=1 - człowiek przerywa mówiącego bota. Tylko ze słuchawkami: z głośnikami głos
+# bota też byłby "mową", więc domyślnie mikrofon jest pomijany na czas odtwarzania
+BARGE_IN = os.getenv("BARGE_IN", "0") == "1"
+# Ile spekulacyjnych zapytań (odpowiedź zawczasu) może być naraz w locie
+speculator = Speculator(executor, budget=int(os.getenv("SPECULATION_BUDGET", "2")))
+
+# Nadawcy spoza runtime'u aktorów - odpowiedzi botów do nich wracają przez outbox
+HUMAN = "człowiek"  # wypowiedzi z mikrofonu (STT)
+FLOOR = "prowadzący"  # tury botów przydzielane przez TurnScheduler
+
+def is_command(text):
+    text = text.lower()
+    return text.startswith(("dodaj bota", "idź bot")) or "do widzenia" in text
+
+def command_phrase(text, bots):
+    # Odpowiedź systemu na komendę (przy obecnym składzie botów) albo None
+    text = text.lower()
+    if text.startswith("dodaj bota"):
+        parts = text.split(" jako ")
+        if len(parts) < 2:
+            return "Błąd: Podaj nazwę bota i charakter, np. 'Dodaj bota Rafał jako pisarz'."
+        return f"Dodano bota {parts[0].replace('dodaj bota ', '').strip()} jako {parts[1].strip()}."
+    if text.startswith("idź bot"):
+        bot_name = text.replace("idź bot ", "").strip()
+        if any(bot.name.lower() == bot_name for bot in bots):
+            return f"Usunięto bota {bot_name}."
+        return f"Nie znaleziono bota {bot_name}."
+    if "do widzenia" in text:
+        return "Do widzenia! Kończę rozmowę."
+    return None
+
+def speculate(bot, text, ggwave=False):
+    # Odpowiedź i jej nagranie (albo fala GGWave) trafiają tylko do cache - prawdziwe
+    # wywołanie w turze bota dostanie je od razu (albo dołączy do trwającego zapytania)
+    response = get_response(text, bot.system_prompt, bot.memory, remember=False)
+    if ggwave:
+        prepare_ggwave(response, link_quality.peek())
+    else:
+        synthesize(response, speaker=bot.name)
+    return response
+
+def find_bot(bots, name):
+    return next((bot for bot in bots if bot.name == name), None)
+
+def say(action):
+    # -> True, jeśli człowiek przerwał wypowiedź (wtedy odpowiedzi liczone zawczasu przepadają)
+    if not BARGE_IN:
+        action(None)
+        return False
+    interrupted = interruptible(action, get_listener().speaking)
+    if interrupted:
+        speculator.discard()
+    return interrupted
+
+def speak_turn(text, name):
+    # Głośnik aktorów - SpeechSink woła go po kolei; przerwanie ucisza też wypowiedzi w kolejce
+    if say(lambda cancelled: speak(text, speaker=name, cancelled=cancelled)):
+        actors.hush()
+
+def prepare_turn(text, name):
+    # Nagranie liczy się, gdy głośnik jest jeszcze zajęty - potem speak() trafia w cache
+    try:
+        prepare(text, speaker=name)
+    except Exception as e:
+        logging.error(f"Błąd syntezy TTS dla {name}: {str(e)}")
+
+# Boty to aktory z własną skrzynką i pamięcią; odpowiedzi liczą się równolegle, mowa idzie po kolei
+actors = ActorThread(responder=llm_responder, speaker=speak_turn, preparer=prepare_turn,
+                     serial_speaker=True, workers=8)
+
+def speculate_next(bots, scheduler, current_bot, response, ggwave=False):
+    # Prawdopodobny następny mówca liczy odpowiedź na bieżącą wypowiedź, zanim ta wybrzmi
+    speculator.discard()  # spekulacje na tę turę są już nieaktualne
+    next_bot = find_bot(bots, scheduler.peek(exclude=current_bot.name))
+    if next_bot is not None and next_bot is not current_bot:
+        speculator.start((next_bot.name, response), speculate, next_bot, response, ggwave)
+
+def take_speculation(bot, context):
+    # Spekulacja na tę turę: czekamy na nią zamiast liczyć od nowa - dalsze wywołania trafią w cache
+    future = speculator.take((bot.name, context))
+    if future is None:
+        return
+    try:
+        future.result()
+        logging.debug(f"⚡ Odpowiedź {bot.name} gotowa zawczasu ({speculator.stats()})")
+    except Exception as e:
+        logging.debug(f"Błąd spekulacji dla {bot.name}: {e}")
+
+def ggwave_pair(speaker, listener_bot, context):
+    # Jedna para na przydzielonym kanale: odpowiedź mówcy i jej nadanie słuchaczowi
+    take_speculation(speaker, context)
+    response = get_response(context, speaker.system_prompt, speaker.memory)
+    logging.info(f"🤖 {speaker.name}: {response}")
+    channel, decoded = exchange(speaker.name, listener_bot.name, response, channel_scheduler, channel_engines)
+    logging.debug(f"[GGWave] {speaker.name} -> {listener_bot.name} kanałem {channel.name}")
+    return speaker, listener_bot, response, decoded
+
+def converse_on_channels(bots, scheduler, last_speaker, context):
+    # Tyle par naraz, ile jest kanałów (i ile par da się złożyć z botów); -> (last_input, last_speaker)
+    speakers = []
+    for _ in range(min(len(CHANNELS), len(bots) // 2)):
+        name = scheduler.peek(exclude=last_speaker)
+        if name is None or name == last_speaker or any(bot.name == name for bot in speakers):
+            break
+        speakers.append(find_bot(bots, scheduler.next(exclude=last_speaker)))
+    listeners = [bot for bot in bots if bot not in speakers]
+    futures = [executor.submit(ggwave_pair, speaker, listener_bot, context)
+               for speaker, listener_bot in zip(speakers, listeners)]
+    last_input = context
+    for future in futures:
+        speaker, listener_bot, response, decoded = future.result()
+        scheduler.mention(response)
+        if decoded == response:
+            logging.info(f"📡 {listener_bot.name} (GGWave od {speaker.name}): {decoded}")
+        else:
+            logging.warning(f"⚠️ {listener_bot.name} nie odebrał {speaker.name} przez GGWave, fallback do TTS")
+            speak(response, speaker=speaker.name)
+        last_input = response
+        last_speaker = speaker.name
+    return last_input, last_speaker
+
+class Prefetcher:
+    # Hipotezy częściowe z STT: wczesne wykrycie komend i spekulacyjne pytanie botów.
+    # Hipotezy są tylko z silnikiem strumieniowym (STT_BACKEND=whisper) albo z
+    # STT_PARTIAL_INTERVAL > 0 - przy domyślnym Google każda kosztowałaby zapytanie, więc ich nie ma.
+    def __init__(self):
+        self.bots = []
+        self.last_partial = ""
+        self.prefetched = ""
+
+    def on_partial(self, text):
+        key = normalize_text(text)
+        # Działamy dopiero, gdy hipoteza się ustabilizowała (dwie takie same z rzędu)
+        if key == self.last_partial and key != self.prefetched:
+            self.prefetched = key
+            if is_command(text):
+                # Komenda: boty nie odpowiedzą, więc ich spekulacje przepadają, a odpowiedź
+                # systemu syntetyzuje się, zanim człowiek skończy mówić
+                speculator.discard()
+                phrase = command_phrase(text, list(self.bots))
+                logging.debug(f"⚡ Wcześnie wykryto komendę: {text} -> {phrase}")
+                speculator.start(None, prepare, phrase)
+            else:
+                logging.debug(f"⚡ Spekulacyjne zapytanie botów: {text}")
+                for bot in list(self.bots):
+                    speculator.start(None, speculate, bot, text)
+        self.last_partial = key
 
 def main():
     logging.info("🤖 Witaj! Rozpoczynamy rozmowę. Powiedz 'do widzenia', aby zakończyć.")
@@ -26,144 +195,124 @@ def main():
     bots = []
     last_input = None
     last_speaker = None
-    silence_counter = 0
+    last_human = time.time()
+    scheduler = TurnScheduler()
+    prefetcher = Prefetcher()
+    listener = get_listener()
+    listener.gate_playback = not BARGE_IN  # przerywanie wymaga słuchania także w trakcie mowy bota
+    listener.add_partial_callback(prefetcher.on_partial)
 
     while True:
         try:
-            user_input = listen()
+            prefetcher.bots = bots
+            user_input = listener.listen_turn(LISTEN_TIMEOUT)
 
             if user_input:
-                silence_counter = 0
+                last_human = time.time()
                 logging.info(f"🧍 Ty: {user_input}")
                 last_input = user_input
                 last_speaker = None
+                scheduler.mention(user_input)
+                speculator.discard()
 
-                # polecenia
+                # polecenia - odpowiedź jak z command_phrase, więc trafia w nagranie przygotowane z hipotezy
                 if user_input.lower().startswith("dodaj bota"):
-                    try:
-                        parts = user_input.lower().split(" jako ")
+                    response = command_phrase(user_input, bots)
+                    parts = user_input.lower().split(" jako ")
+                    if len(parts) > 1:
                         bot_name = parts[0].replace("dodaj bota ", "").strip()
                         bot_character = parts[1].strip()
-                        bots.append(Bot(bot_name, f"Jesteś {bot_character}, który odpowiada w języku polskim."))
-                        response = f"Dodano bota {bot_name} jako {bot_character}."
-                        logging.info(f"🤖 System: {response}")
-                        speak(response)
-                    except IndexError:
-                        response = "Błąd: Podaj nazwę bota i charakter, np. 'Dodaj bota Rafał jako pisarz'."
-                        logging.info(f"🤖 System: {response}")
-                        speak(response)
+                        bots.append(actors.spawn(bot_name, f"Jesteś {bot_character}, który odpowiada w języku polskim."))
+                        scheduler.add(bot_name)
+                    logging.info(f"🤖 System: {response}")
+                    speak(response)
                     continue
 
                 if user_input.lower().startswith("idź bot"):
-                    try:
-                        bot_name = user_input.lower().replace("idź bot ", "").strip()
-                        bots_before = len(bots)
-                        bots = [bot for bot in bots if bot.name.lower() != bot_name.lower()]
-                        if len(bots) < bots_before:
-                            response = f"Usunięto bota {bot_name}."
-                            if last_speaker and last_speaker.lower() == bot_name.lower():
-                                last_speaker = None
-                        else:
-                            response = f"Nie znaleziono bota {bot_name}."
-                        logging.info(f"🤖 System: {response}")
-                        speak(response)
-                    except Exception:
-                        response = "Błąd: Podaj poprawną nazwę bota, np. 'Idź bot Rafał'."
-                        logging.info(f"🤖 System: {response}")
-                        speak(response)
+                    response = command_phrase(user_input, bots)
+                    bot_name = user_input.lower().replace("idź bot ", "").strip()
+                    removed = [bot for bot in bots if bot.name.lower() == bot_name]
+                    bots = [bot for bot in bots if bot.name.lower() != bot_name]
+                    for bot in removed:
+                        actors.remove(bot.name)
+                        scheduler.remove(bot.name)
+                    if removed and last_speaker and last_speaker.lower() == bot_name:
+                        last_speaker = None
+                    logging.info(f"🤖 System: {response}")
+                    speak(response)
                     continue
 
                 if "do widzenia" in user_input.lower():
-                    response = "Do widzenia! Kończę rozmowę."
+                    response = command_phrase(user_input, bots)
                     logging.info(f"🤖 System: {response}")
                     speak(response)
                     break
 
-            else:
-                silence_counter += 1
+            silence = time.time() - last_human
 
             if bots:
                 if user_input:
-                    for bot in bots:
-                        response = get_response(user_input, bot.system_prompt)
-                        logging.info(f"🤖 {bot.name}: {response}")
-                        try:
-                            speak(f"{bot.name} mówi: {response}")
-                            last_input = response
-                            last_speaker = bot.name
-                            time.sleep(0.5)
-                        except Exception as e:
-                            logging.error(f"Błąd TTS dla {bot.name}: {str(e)}")
+                    # Wypowiedź człowieka do wszystkich botów; odpowiedzi przychodzą, gdy są policzone
+                    replies = actors.ask(Envelope(HUMAN, BROADCAST, user_input, 1))
+                    for reply in replies:
+                        logging.info(f"🤖 {reply.sender}: {reply.text}")
+                        last_input = reply.text
+                        last_speaker = reply.sender
+                    if replies:
+                        speculate_next(bots, scheduler, find_bot(bots, last_speaker), last_input)
+                    actors.join()  # okno dla człowieka liczy się od końca mowy botów
+
+                # Następny mówca z kolejki (sprawiedliwie, wywołani po imieniu wcześniej); bez powtórzeń z rzędu
+                upcoming = scheduler.peek(exclude=last_speaker)
+                if upcoming == last_speaker or listener.speaking.is_set():
+                    upcoming = None
+
+                #  GGWAVE  same boty - równoległe pary na osobnych kanałach
+                if upcoming and silence >= GGWAVE_AFTER and len(bots) > 1 and GGWAVE_CHANNELS:
+                    context = last_input if last_input else "Cześć, co słychać?"
+                    last_input, last_speaker = converse_on_channels(bots, scheduler, last_speaker, context)
 
                 #  GGWAVE  same boty
-                if silence_counter >= 2 and len(bots) > 1:
-                    current_bot = random.choice([b for b in bots if b.name != last_speaker])
+                elif upcoming and silence >= GGWAVE_AFTER and len(bots) > 1:
+                    current_bot = find_bot(bots, scheduler.next(exclude=last_speaker))
                     context = last_input if last_input else "Cześć, co słychać?"
-                    response = get_response(context, current_bot.system_prompt)
+                    take_speculation(current_bot, context)
+                    response = get_response(context, current_bot.system_prompt, current_bot.memory)
                     logging.info(f"🤖 {current_bot.name}: {response}")
+                    scheduler.mention(response)
+                    speculate_next(bots, scheduler, current_bot, response, ggwave=True)
 
-                    # odpowiedzi od słuchajacyhc botow
-                    result_queue = Queue()
-                    stop_event = threading.Event()
-                    threads = []
-
-                    # Start odp
-                    for bot in [b for b in bots if b.name != current_bot.name]:
-                        thread = threading.Thread(
-                            target=receive_via_ggwave,
-                            args=(result_queue, stop_event, bot.name, 12.0)  #tu do zmiany na 2 sek ciszy czy cos potem
-                        )
-                        threads.append(thread)
-                        thread.start()
-
-                    #słychanie bo sa bledy jak za szybko
-                    time.sleep(1.0)
-                    #gg plus czekanie plus koniec sluchania
-                    send_thread = threading.Thread(target=send_via_ggwave, args=(response,))
-                    send_thread.start()
-
-                    send_thread.join()
-                    time.sleep(2.0)  
-
-                    stop_event.set()
-
-                    for thread in threads:
-                        thread.join()
-
-                    # Zbieramy wyniki z kolejki
-                    received_messages = []
-                    while not result_queue.empty():
-                        bot_name, decoded = result_queue.get()
-                        if decoded:
-                            received_messages.append((bot_name, decoded))
+                    # mikrofon STT zwalnia urządzenie na czas odbioru GGWave (ten sam sprzęt wejściowy)
+                    receivers = [bot.name for bot in bots if bot.name != current_bot.name]
+                    received_messages = broadcast_exchange(current_bot.name, receivers, response,
+                                                           listener=None if GGWAVE_BUS else listener)
 
                     if received_messages:
                         # Wybieramy pierwszego bota, który odebrał wiadomość
-                        bot_name, decoded = random.choice(received_messages)
+                        bot_name, decoded = received_messages[0]
                         logging.info(f"📡 {bot_name} (GGWave odebrane): {decoded}")
                         last_input = decoded
                         last_speaker = current_bot.name
                     else:
                         logging.warning("⚠️ Żaden bot nie odebrał wiadomości przez GGWave, fallback do TTS")
-                        speak(f"{current_bot.name} mówi: {response}")
+                        speak(response, speaker=current_bot.name)
                         last_input = response
                         last_speaker = current_bot.name
 
-                elif len(bots) >= 1:
-                    available_bots = [bot for bot in bots if bot.name != last_speaker]
-                    if available_bots:
-                        logging.info("🤖 Boty rozmawiają między sobą (tryb normalny)...")
-                        current_bot = random.choice(available_bots)
-                        context = last_input if last_input else "Cześć, co słychać?"
-                        response = get_response(context, current_bot.system_prompt)
+                elif upcoming:
+                    logging.info("🤖 Boty rozmawiają między sobą (tryb normalny)...")
+                    current_bot = find_bot(bots, scheduler.next(exclude=last_speaker))
+                    context = last_input if last_input else "Cześć, co słychać?"
+                    take_speculation(current_bot, context)
+                    replies = actors.ask(Envelope(FLOOR, current_bot.name, context, 1))
+                    if replies:
+                        response = replies[0].text
                         logging.info(f"🤖 {current_bot.name}: {response}")
-                        try:
-                            speak(f"{current_bot.name} mówi: {response}")
-                            last_input = response
-                            last_speaker = current_bot.name
-                            time.sleep(0.5)
-                        except Exception as e:
-                            logging.error(f"Błąd TTS dla {current_bot.name}: {str(e)}")
+                        scheduler.mention(response)
+                        speculate_next(bots, scheduler, current_bot, response)
+                        last_input = response
+                        last_speaker = current_bot.name
+                    actors.join()
 
             if not bots and user_input and not user_input.lower().startswith(("dodaj bota", "do widzenia")):
                 response = "Nie ma żadnych botów. Dodaj bota komendą 'Dodaj bota <nazwa> jako <charakter>'."
@@ -174,5 +323,7 @@ def main():
             logging.error(f"Błąd w głównej pętli: {str(e)}", exc_info=True)
             continue
 
+    actors.shutdown()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,89 @@
+import threading
+from collections import deque
+
+# Przybliżona liczba tokenów - ok. 4 znaki na token wystarcza do pilnowania budżetu
+def count_tokens(text):
+    return len(text) // 4 + 1
+
+SUMMARY_PREFIX = "Wcześniej w rozmowie: "
+
+def compact_summary(summary, turns, max_tokens):
+    # Tani, lokalny skrót: dokleja pierwsze zdanie każdej starej wypowiedzi
+    # i zostawia tylko najnowszy fragment mieszczący się w limicie
+    parts = [summary] if summary else []
+    for role, content in turns:
+        first_sentence = content.split(". ")[0].strip()
+        parts.append(f"{'Ty' if role == 'assistant' else 'Rozmówca'}: {first_sentence}")
+    text = " | ".join(parts)
+    max_chars = max_tokens * 4
+    if len(text) > max_chars:
+        text = "…" + text[-max_chars:]
+    return text
+
+class ConversationMemory:
+    """Krocząca historia rozmowy jednego bota z budżetem tokenów.
+
+    Ostatnie wypowiedzi trzymane są w buforze cyklicznym o stałej długości, więc
+    pamięć na bota jest przewidywalna nawet przy tysiącach botów. Wypowiedzi,
+    które wypadły z bufora lub z budżetu, są streszczane dopiero przy budowaniu
+    kolejnego zapytania.
+    """
+    __slots__ = ("turns", "token_budget", "summary_tokens", "summary", "pending", "summarizer", "lock")
+
+    def __init__(self, max_turns=12, token_budget=300, summary_tokens=60, summarizer=compact_summary):
+        self.turns = deque(maxlen=max_turns)  # (role, content, tokens)
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self.summary = ""
+        self.pending = []  # wypowiedzi czekające na streszczenie
+        self.summarizer = summarizer
+        self.lock = threading.Lock()
+
+    def add(self, role, content):
+        if not content:
+            return
+        with self.lock:
+            if len(self.turns) == self.turns.maxlen:
+                old_role, old_content, _ = self.turns[0]
+                self.pending.append((old_role, old_content))
+            self.turns.append((role, content, count_tokens(content)))
+
+    def build_messages(self, system_prompt, user_input):
+        with self.lock:
+            budget = self.token_budget - count_tokens(system_prompt) - count_tokens(user_input)
+            # Miejsce na streszczenie także wtedy, gdy powstanie dopiero teraz, przy przycinaniu
+            if self.summary or self.pending or sum(tokens for _, _, tokens in self.turns) > budget:
+                budget -= self.summary_tokens
+            recent = []
+            # Od najnowszych wstecz, dopóki mieści się w budżecie
+            for role, content, tokens in reversed(self.turns):
+                if tokens > budget:
+                    break
+                budget -= tokens
+                recent.append({"role": role, "content": content})
+            recent.reverse()
+
+            overflow = len(self.turns) - len(recent)
+            if overflow:
+                # Starsze wypowiedzi spoza budżetu też trafiają do streszczenia
+                for _ in range(overflow):
+                    old_role, old_content, _ = self.turns.popleft()
+                    self.pending.append((old_role, old_content))
+            if self.pending:
+                # Limit streszczenia obejmuje też jego nagłówek
+                limit = self.summary_tokens - count_tokens(SUMMARY_PREFIX) - 1
+                self.summary = self.summarizer(self.summary, self.pending, limit)
+                self.pending = []
+
+            messages = [{"role": "system", "content": system_prompt}]
+            if self.summary:
+                messages.append({"role": "system", "content": SUMMARY_PREFIX + self.summary})
+            messages.extend(recent)
+            messages.append({"role": "user", "content": user_input})
+            return messages
+
+    def clear(self):
+        with self.lock:
+            self.turns.clear()
+            self.pending = []
+            self.summary = ""
@@ -0,0 +1,31 @@
+import time
+import threading
+from contextlib import contextmanager
+
+# Czy z głośników leci właśnie dźwięk bota (mowa TTS albo GGWave). stt.Listener
+# pomija wtedy mikrofon, żeby boty nie brały własnego głosu za wypowiedź człowieka.
+_lock = threading.Lock()
+_active = 0
+_last_end = 0.0
+
+@contextmanager
+def playing():
+    global _active, _last_end
+    with _lock:
+        _active += 1
+    try:
+        yield
+    finally:
+        with _lock:
+            _active -= 1
+            _last_end = time.time()
+
+def is_playing(tail=0.0):
+    # tail - pogłos w pokoju po końcu odtwarzania też jeszcze się liczy
+    with _lock:
+        return _active > 0 or time.time() - _last_end < tail
+
+def quiet_for():
+    # Ile sekund głośniki milczą (0, gdy coś właśnie gra)
+    with _lock:
+        return 0.0 if _active > 0 else time.time() - _last_end
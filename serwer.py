@@ -3,12 +3,15 @@ from fastapi.responses import HTMLResponse
 from pyngrok import ngrok
 import uvicorn
 from typing import Dict, List, Optional
-from openai import OpenAI
+from openai import AsyncOpenAI
 from dotenv import load_dotenv
+import httpx
 import os
 import uuid
+import json
 import logging
 import asyncio
+from memory import ConversationMemory
 
 # Konfiguracja logowania
 logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -31,7 +34,25 @@ api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     logging.error("Brak klucza OPENAI_API_KEY w pliku klucz.env")
     raise ValueError("Brak klucza OpenAI API")
-client = OpenAI(api_key=api_key)
+
+# Jeden współdzielony, asynchroniczny klient HTTP z pulą połączeń - odpowiedź bota
+# nie blokuje pętli zdarzeń, więc reszta WebSocketów działa w tym czasie normalnie.
+# OPENAI_BASE_URL pozwala podmienić OpenAI na lokalny serwer-atrapę (np. do testów).
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "20"))
+http_client = httpx.AsyncClient(
+    limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    timeout=httpx.Timeout(LLM_TIMEOUT, connect=5.0)
+)
+client = AsyncOpenAI(
+    api_key=api_key,
+    base_url=os.getenv("OPENAI_BASE_URL") or None,
+    http_client=http_client,
+    max_retries=1
+)
+
+@app.on_event("shutdown")
+async def close_http_client():
+    await http_client.aclose()
 
 # HTML dla frontendu
 html = """
@@ -89,6 +110,7 @@ html = """
     let userBots = [];
     let messageQueue = []; // Kolejka wiadomości
     let isProcessingQueue = false; // Flaga przetwarzania kolejki
+    let streams = {}; // Odpowiedzi botów wyświetlane na bieżąco (stream_id -> stan)
 
     function connectWebSocket() {
         console.log("Łączenie WebSocket dla userId:", userId);
@@ -152,6 +174,32 @@ html = """
                 } else {
                     console.log(`Pomijanie TTS dla wiadomości: ${data.content}`);
                 }
+            } else if (data.type === "stream_start") {
+                let div = document.createElement("div");
+                div.textContent = `🤖 ${data.name}: `;
+                msgBox.appendChild(div);
+                streams[data.stream_id] = { div: div, pending: "", lastSpoken: null };
+            } else if (data.type === "stream_delta") {
+                let stream = streams[data.stream_id];
+                if (stream) {
+                    stream.div.textContent += data.delta;
+                    msgBox.scrollTop = msgBox.scrollHeight;
+                    // Czytaj każde zakończone zdanie od razu, nie czekając na całą odpowiedź
+                    stream.pending += data.delta;
+                    let match;
+                    while ((match = stream.pending.match(/^([\\s\\S]*?[.!?…])\\s+/))) {
+                        speakChunk(stream, match[1]);
+                        stream.pending = stream.pending.slice(match[0].length);
+                    }
+                }
+            } else if (data.type === "stream_end") {
+                let stream = streams[data.stream_id];
+                if (stream) {
+                    stream.div.textContent = data.content;
+                    speakChunk(stream, stream.pending);
+                    if (stream.lastSpoken) await stream.lastSpoken;
+                    delete streams[data.stream_id];
+                }
             } else if (data.type === "user_list") {
                 let userList = document.getElementById("userList");
                 let usersHtml = "<strong>Użytkownicy:</strong> " + (data.users.length ? data.users.join(", ") : "Brak");
@@ -170,7 +218,9 @@ html = """
             }
             // Ustal opóźnienie w zależności od typu wiadomości
             let delay = 2000;
-            if (data.type === "timeout_info" && data.content.includes("Oczekiwanie na wiadomość użytkownika")) {
+            if (data.type === "stream_start" || data.type === "stream_delta") {
+                delay = 0; // Fragmenty strumienia wyświetlamy bez przerwy
+            } else if (data.type === "timeout_info" && data.content.includes("Oczekiwanie na wiadomość użytkownika")) {
                 delay = 7000; // 5 sekund oczekiwania + 2 sekundy bufor
             }
             await new Promise(resolve => setTimeout(resolve, delay));
@@ -179,6 +229,23 @@ html = """
         isProcessingQueue = false;
     }
 
+    // Czytanie kawałka strumienia - przeglądarka sama kolejkuje kolejne wypowiedzi
+    function speakChunk(stream, text) {
+        text = text.trim();
+        if (!text) return;
+        try {
+            let utterance = new SpeechSynthesisUtterance(text);
+            utterance.lang = "pl-PL";
+            stream.lastSpoken = new Promise(resolve => {
+                utterance.onend = resolve;
+                utterance.onerror = resolve;
+            });
+            window.speechSynthesis.speak(utterance);
+        } catch (e) {
+            console.error("Błąd TTS:", e);
+        }
+    }
+
     function updateButtons() {
         let addBotButton = document.getElementById("addBotButton");
         let removeBotButton = document.getElementById("removeBotButton");
@@ -296,25 +363,93 @@ class Bot:
         self.name = name
         self.system_prompt = f"Jesteś {character}, który odpowiada zwięźle po polsku."
         self.owner_id = owner_id
+        self.memory = ConversationMemory()
 
     async def respond(self, message: str) -> str:
         logging.debug(f"Bot {self.name} próbuje odpowiedzieć na: {message}")
         try:
-            response = client.chat.completions.create(
+            response = await client.chat.completions.create(
                 model="gpt-3.5-turbo",
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": message}
-                ],
-                max_tokens=30
+                messages=self.memory.build_messages(self.system_prompt, message),
+                max_tokens=30,
+                timeout=LLM_TIMEOUT
             )
             answer = response.choices[0].message.content.strip()
+            self.memory.add("user", message)
+            self.memory.add("assistant", answer)
             logging.info(f"Bot {self.name} odpowiada: {answer}")
             return answer
         except Exception as e:
             logging.error(f"Błąd odpowiedzi bota {self.name}: {str(e)}")
             return f"{self.name}: Cześć, co słychać?"
 
+    async def respond_stream(self, message: str):
+        # To samo co respond(), ale oddaje kolejne fragmenty odpowiedzi, gdy tylko przyjdą
+        logging.debug(f"Bot {self.name} strumieniuje odpowiedź na: {message}")
+        parts = []
+        try:
+            stream = await client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=self.memory.build_messages(self.system_prompt, message),
+                max_tokens=30,
+                stream=True,
+                timeout=LLM_TIMEOUT
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            logging.error(f"Błąd strumienia bota {self.name}: {str(e)}")
+            if not parts:
+                yield f"{self.name}: Cześć, co słychać?"
+                return
+        answer = "".join(parts).strip()
+        logging.info(f"Bot {self.name} odpowiada: {answer}")
+        self.memory.add("user", message)
+        self.memory.add("assistant", answer)
+
+def persona_context(number: int, bot: Bot, message: str) -> str:
+    # Charakter bota i jego dotychczasowa rozmowa (streszczenie + ostatnie wypowiedzi w jego
+    # budżecie tokenów) - ta sama historia, którą dostałby przy osobnym zapytaniu
+    history = bot.memory.build_messages(bot.system_prompt, message)[1:-1]
+    lines = [f"{number}. {bot.name}: {bot.system_prompt}"]
+    for item in history:
+        speaker = {"user": "Rozmówca", "assistant": bot.name}.get(item["role"], "Kontekst")
+        lines.append(f"   {speaker}: {item['content']}")
+    return "\n".join(lines)
+
+async def batch_complete(bots: List[Bot], message: str) -> Dict[str, str]:
+    # Jedno zapytanie za kilka botów - model zwraca JSON {numer bota: odpowiedź}
+    personas = "\n".join(persona_context(i, bot, message) for i, bot in enumerate(bots, 1))
+    system_prompt = (
+        "Odpowiadasz w imieniu kilku botów naraz. Każdy ma swój charakter i swoją "
+        "dotychczasową rozmowę:\n"
+        f"{personas}\n"
+        "Zwróć wyłącznie obiekt JSON, w którym kluczem jest numer bota, "
+        "a wartością jego zwięzła odpowiedź po polsku, zgodna z jego charakterem."
+    )
+    response = await client.chat.completions.create(
+        model="gpt-3.5-turbo",
+        messages=[
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": message}
+        ],
+        max_tokens=40 * len(bots),
+        response_format={"type": "json_object"},
+        timeout=LLM_TIMEOUT
+    )
+    data = json.loads(response.choices[0].message.content)
+    replies = {}
+    for i, bot in enumerate(bots, 1):
+        reply = data.get(str(i))
+        if isinstance(reply, str) and reply.strip():
+            replies[bot.id] = reply.strip()
+    return replies
+
 class ConnectionManager:
     def __init__(self):
         self.active_connections: Dict[str, WebSocket] = {}  # user_id -> WebSocket
@@ -322,6 +457,11 @@ class ConnectionManager:
         self.bots: List[Bot] = []  # Lista botów
         self.last_message_was_bot: bool = False  # Flaga, czy ostatnia wiadomość była od bota
         self.timeout_seconds: int = 5  # Timeout w sekundach
+        self.parallel_bots: bool = os.getenv("PARALLEL_BOTS", "1") == "1"  # Wszystkie boty myślą naraz
+        self.max_concurrent_bots: int = int(os.getenv("MAX_CONCURRENT_BOTS", "4"))  # Limit zapytań do API naraz
+        self.bot_semaphore = asyncio.Semaphore(self.max_concurrent_bots)
+        self.batch_replies: bool = os.getenv("BATCH_REPLIES", "0") == "1"  # Jedno zapytanie za wszystkie boty
+        self.stream_replies: bool = os.getenv("STREAM_REPLIES", "1") == "1"  # Tokeny na bieżąco do pokoju
 
     async def connect(self, websocket: WebSocket, user_id: str):
         await websocket.accept()
@@ -359,18 +499,111 @@ class ConnectionManager:
             "bots": [{"name": bot.name, "owner": self.users.get(bot.owner_id, bot.owner_id), "owner_id": bot.owner_id} for bot in self.bots]
         })
 
+    def remember_reply(self, speaker: Bot, response: str):
+        # Pozostałe boty w pokoju "słyszą" odpowiedź i mają ją w swojej historii
+        for bot in self.bots:
+            if bot is not speaker:
+                bot.memory.add("user", f"{speaker.name}: {response}")
+
+    async def limited_respond(self, bot: Bot, message: str) -> str:
+        # Semafor pilnuje, żeby duży pokój nie przekroczył limitu zapytań do API
+        async with self.bot_semaphore:
+            logging.debug(f"Bot {bot.name} (owner_id: {bot.owner_id}) zaczyna myśleć")
+            return await bot.respond(message)
+
+    async def batch_respond(self, bots: List[Bot], message: str) -> Dict[str, str]:
+        replies = {}
+        try:
+            async with self.bot_semaphore:
+                replies = await batch_complete(bots, message)
+        except Exception as e:
+            logging.error(f"Błąd zbiorczego zapytania dla {len(bots)} botów: {str(e)}")
+        for bot in bots:
+            if bot.id in replies:
+                logging.info(f"Bot {bot.name} odpowiada (zbiorczo): {replies[bot.id]}")
+                bot.memory.add("user", message)
+                bot.memory.add("assistant", replies[bot.id])
+        # Boty, których odpowiedzi nie udało się odczytać, pytamy pojedynczo
+        missing = [bot for bot in bots if bot.id not in replies]
+        if missing:
+            logging.warning(f"Brak odpowiedzi zbiorczej dla: {', '.join(bot.name for bot in missing)}, pytam osobno")
+            results = await asyncio.gather(*(self.limited_respond(bot, message) for bot in missing))
+            replies.update((bot.id, result) for bot, result in zip(missing, results))
+        return replies
+
+    async def produce_stream(self, bot: Bot, message: str, queue: asyncio.Queue):
+        # Producent: tokeny z API trafiają do kolejki, None oznacza koniec odpowiedzi
+        try:
+            async with self.bot_semaphore:
+                async for delta in bot.respond_stream(message):
+                    queue.put_nowait(delta)
+        finally:
+            queue.put_nowait(None)
+
+    async def deliver_stream(self, bot: Bot, queue: asyncio.Queue) -> str:
+        stream_id = str(uuid.uuid4())
+        await self.broadcast({"type": "stream_start", "stream_id": stream_id, "name": bot.name})
+        parts = []
+        while (delta := await queue.get()) is not None:
+            parts.append(delta)
+            await self.broadcast({"type": "stream_delta", "stream_id": stream_id, "delta": delta})
+        response = "".join(parts).strip()
+        await self.broadcast({"type": "stream_end", "stream_id": stream_id, "content": f"🤖 {bot.name}: {response}"})
+        return response
+
     async def handle_message(self, user_id: str, message: str, user_name: str):
         logging.debug(f"Obsługa wiadomości od {user_name} (ID: {user_id}): {message}")
         self.last_message_was_bot = False
         await self.broadcast({"type": "message", "content": f"💬 {user_name}: {message}"})
         logging.debug(f"Liczba botów: {len(self.bots)}")
         any_bot_responded = False
-        for bot in self.bots:
-            logging.debug(f"Sprawdzanie bota {bot.name} (owner_id: {bot.owner_id}, user_id: {user_id})")
-            response = await bot.respond(message)
-            await self.broadcast({"type": "message", "content": f"🤖 {bot.name}: {response}"})
-            any_bot_responded = True
-            await asyncio.sleep(2)  # 2-sekundowa przerwa między odpowiedziami botów
+        bots = list(self.bots)
+        if self.batch_replies and len(bots) > 1:
+            replies = await self.batch_respond(bots, message)
+            for bot in bots:
+                response = replies[bot.id]
+                await self.broadcast({"type": "message", "content": f"🤖 {bot.name}: {response}"})
+                self.remember_reply(bot, response)
+                any_bot_responded = True
+                await asyncio.sleep(2)  # 2-sekundowa przerwa między odpowiedziami botów
+        elif self.parallel_bots:
+            # Wszystkie odpowiedzi liczą się równolegle (z limitem), a przerwy służą już tylko
+            # do wypuszczania ich po kolei - jeden bot mówi naraz, tak jak oczekuje frontend
+            if self.stream_replies:
+                # Tokeny kolejnych botów czekają w kolejkach, aż przyjdzie ich kolej
+                queues = [asyncio.Queue() for _ in bots]
+                tasks = [asyncio.create_task(self.produce_stream(bot, message, q)) for bot, q in zip(bots, queues)]
+            else:
+                tasks = [asyncio.create_task(self.limited_respond(bot, message)) for bot in bots]
+            try:
+                for i, bot in enumerate(bots):
+                    if self.stream_replies:
+                        response = await self.deliver_stream(bot, queues[i])
+                    else:
+                        response = await tasks[i]
+                        await self.broadcast({"type": "message", "content": f"🤖 {bot.name}: {response}"})
+                    self.remember_reply(bot, response)
+                    any_bot_responded = True
+                    await asyncio.sleep(2)  # 2-sekundowa przerwa między odpowiedziami botów
+            finally:
+                for task in tasks:
+                    task.cancel()
+        else:
+            for bot in bots:
+                logging.debug(f"Sprawdzanie bota {bot.name} (owner_id: {bot.owner_id}, user_id: {user_id})")
+                if self.stream_replies:
+                    queue = asyncio.Queue()
+                    task = asyncio.create_task(self.produce_stream(bot, message, queue))
+                    try:
+                        response = await self.deliver_stream(bot, queue)
+                    finally:
+                        task.cancel()
+                else:
+                    response = await bot.respond(message)
+                    await self.broadcast({"type": "message", "content": f"🤖 {bot.name}: {response}"})
+                self.remember_reply(bot, response)
+                any_bot_responded = True
+                await asyncio.sleep(2)  # 2-sekundowa przerwa między odpowiedziami botów
         if any_bot_responded:
             self.last_message_was_bot = True
             await self.broadcast({"type": "timeout_info", "content": f"⏳ Oczekiwanie na wiadomość użytkownika ({self.timeout_seconds} sekund)"})
@@ -1,16 +1,383 @@
+import os
+import sys
+import glob
+import time
+import logging
+import threading
+from collections import deque
+from queue import Queue, Empty
+import numpy as np
 import speech_recognition as sr
+import playback
 
-def listen():
-    r = sr.Recognizer()
-    with sr.Microphone() as source:
-        print("🎤 Mów teraz... (5 sekund na rozpoczęcie)")
+def rms(buffer, sample_width):
+    # Energia fragmentu w tej samej skali co energy_threshold z speech_recognition
+    dtype = {1: np.int8, 2: np.int16, 4: np.int32}[sample_width]
+    samples = np.frombuffer(buffer, dtype=dtype).astype(np.float64)
+    return float(np.sqrt(np.mean(samples ** 2))) if len(samples) else 0.0
+
+STT_ERROR = "Błąd połączenia ze STT"
+
+class GoogleBackend:
+    # Rozpoznawanie w chmurze Google - jedno zapytanie sieciowe na wypowiedź
+    name = "google"
+    streaming = False  # częściowe hipotezy kosztowałyby osobne zapytanie każda
+
+    def __init__(self):
+        self.recognizer = sr.Recognizer()
+
+    def transcribe(self, audios, language="pl-PL"):
+        texts = []
+        for audio in audios:
+            try:
+                texts.append(self.recognizer.recognize_google(audio, language=language))
+            except sr.UnknownValueError:
+                texts.append("")
+            except sr.RequestError as e:
+                texts.append(f"{STT_ERROR}: {str(e)}")
+        return texts
+
+class WhisperBackend:
+    # Lokalny model (offline) przez transformers; ładowany raz, przy pierwszym użyciu
+    name = "whisper"
+    streaming = True
+
+    def __init__(self, model=None, threads=None, batch_size=4):
+        self.model = model or os.getenv("STT_MODEL", "openai/whisper-tiny")
+        self.threads = threads or int(os.getenv("STT_THREADS", str(os.cpu_count() or 1)))
+        self.batch_size = batch_size
+        self.pipe = None
+        self.lock = threading.Lock()
+        self.infer_lock = threading.Lock()  # wypowiedzi i hipotezy częściowe z dwóch wątków
+
+    def load(self):
+        with self.lock:
+            if self.pipe is None:
+                import torch
+                from transformers import pipeline
+                torch.set_num_threads(self.threads)
+                start = time.time()
+                self.pipe = pipeline("automatic-speech-recognition", model=self.model, device="cpu")
+                logging.info(f"🧠 Załadowano model STT {self.model} w {time.time() - start:.1f}s")
+        return self.pipe
+
+    def transcribe(self, audios, language="pl-PL"):
+        pipe = self.load()
+        inputs = [
+            {"raw": np.frombuffer(audio.get_raw_data(convert_rate=16000, convert_width=2), dtype=np.int16).astype(np.float32) / 32768.0,
+             "sampling_rate": 16000}
+            for audio in audios
+        ]
+        with self.infer_lock:
+            results = pipe(inputs, batch_size=self.batch_size,
+                           generate_kwargs={"language": language.split("-")[0], "task": "transcribe"})
+        return [result["text"].strip() for result in results]
+
+BACKENDS = {"google": GoogleBackend, "whisper": WhisperBackend}
+
+def create_backend(name=None):
+    # Wybór silnika przez STT_BACKEND (domyślnie google)
+    name = name or os.getenv("STT_BACKEND", "google")
+    logging.info(f"Silnik STT: {name}")
+    return BACKENDS[name]()
+
+class Listener:
+    """Długo żyjąca sesja rozpoznawania mowy.
+
+    Strumień audio jest otwierany i kalibrowany raz, a wątek w tle cały czas
+    wykrywa mowę (VAD na energii sygnału) i wrzuca gotowe wypowiedzi do kolejki.
+    Zamiast mikrofonu można podać sr.AudioFile("nagranie.wav") - bez sprzętu.
+
+    Gdy bot mówi przez głośnik (playback.playing), mikrofon jest pomijany, a
+    pause()/resume() zwalnia urządzenie np. na czas odbioru GGWave. Wypowiedź
+    zaczęta wcześniej nie przepada - idzie do rozpoznania z tym, co już nagrane.
+    listen_turn() daje człowiekowi okno na odezwanie się, zanim mówić zacznie bot.
+    """
+
+    def __init__(self, source=None, backend=None, language="pl-PL", pause_threshold=0.8, phrase_time_limit=15.0,
+                 calibrate=True, batch_size=4, partial_interval=None, gate_playback=True, echo_tail=0.3):
+        self.source = source if source is not None else sr.Microphone()
+        self.backend = backend if backend is not None else create_backend()
+        self.batch_size = batch_size
+        # Co ile sekund mowy wysyłać hipotezę częściową (0 = wyłączone)
+        if partial_interval is None:
+            partial_interval = float(os.getenv("STT_PARTIAL_INTERVAL", "0.7" if self.backend.streaming else "0"))
+        self.partial_interval = partial_interval
+        self.partial_callbacks = []
+        self.partial_queue = Queue()
+        self.language = language
+        self.pause_threshold = pause_threshold
+        self.phrase_time_limit = phrase_time_limit
+        self.calibrate = calibrate
+        self.recognizer = sr.Recognizer()  # tylko kalibracja i próg energii
+        self.utterances = Queue()  # rozpoznany tekst
+        self.audio_queue = Queue()  # nagrania czekające na rozpoznanie
+        self.stop_event = threading.Event()
+        self.finished = threading.Event()  # źródło się skończyło (np. koniec pliku WAV)
+        self.speaking = threading.Event()  # trwa wypowiedź
+        self.last_voice = 0.0  # ostatni fragment powyżej progu energii
+        # gate_playback=False tylko ze słuchawkami - inaczej głos bota wraca jako "człowiek"
+        self.gate_playback = gate_playback
+        self.echo_tail = echo_tail
+        self.paused = threading.Event()
+        self.released = threading.Event()  # wątek nasłuchu zamknął urządzenie po pause()
+        self.threads = []
+
+    def start(self):
+        self.source.__enter__()
+        if self.calibrate and isinstance(self.source, sr.Microphone):
+            logging.info("🎤 Kalibracja szumu tła...")
+            self.recognizer.adjust_for_ambient_noise(self.source, duration=0.5)
+        targets = [self.capture_loop, self.recognize_loop]
+        if self.partial_interval:
+            targets.append(self.partial_loop)
+        for target in targets:
+            thread = threading.Thread(target=target, daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join(timeout=2.0)
+        if not self.released.is_set():
+            self.source.__exit__(None, None, None)
+
+    def pause(self):
+        # Zwalnia mikrofon (np. dla silnika GGWave na tym samym urządzeniu) do resume()
+        self.paused.set()
+        if not self.released.wait(timeout=2.0):
+            logging.warning("🎤 Nasłuch nie zwolnił mikrofonu w 2 s")
+
+    def resume(self):
+        self.paused.clear()
+
+    def hold(self):
+        # Wątek nasłuchu: zamyka urządzenie na czas pauzy i otwiera je ponownie
+        microphone = isinstance(self.source, sr.Microphone)
+        if microphone:
+            self.source.__exit__(None, None, None)
+        self.released.set()
+        while self.paused.is_set() and not self.stop_event.is_set():
+            self.stop_event.wait(0.05)
+        if self.stop_event.is_set():
+            return
+        if microphone:
+            self.source.__enter__()
+        self.released.clear()
+
+    def capture_loop(self):
+        source = self.source
+        r = self.recognizer
+        chunk_seconds = source.CHUNK / source.SAMPLE_RATE
+        preroll = deque(maxlen=int(0.3 / chunk_seconds) + 1)  # początek słowa sprzed progu
+        frames = []
+        silence = 0.0
+        since_partial = 0.0
+        try:
+            while not self.stop_event.is_set():
+                if self.paused.is_set():
+                    if frames:
+                        self.emit(frames)  # zaczęta wypowiedź idzie do rozpoznania, zanim zwolnimy mikrofon
+                    frames, silence, since_partial = [], 0.0, 0.0
+                    self.speaking.clear()
+                    self.hold()
+                    continue
+                buffer = source.stream.read(source.CHUNK)
+                if not buffer:
+                    break
+                if self.gate_playback and playback.is_playing(self.echo_tail):
+                    # Głos bota z głośnika to nie wypowiedź (próg zostaje bez zmian). Wypowiedź
+                    # zaczętą przed odtwarzaniem kończymy na tym, co już nagrane - nie przepada
+                    if frames:
+                        self.emit(frames)
+                        frames, silence, since_partial = [], 0.0, 0.0
+                    preroll.clear()
+                    continue
+                energy = rms(buffer, source.SAMPLE_WIDTH)
+                if energy > r.energy_threshold:
+                    self.last_voice = time.time()
+                    if not frames:
+                        frames.extend(preroll)
+                        preroll.clear()
+                        self.speaking.set()
+                    frames.append(buffer)
+                    silence = 0.0
+                elif frames:
+                    frames.append(buffer)
+                    silence += chunk_seconds
+                else:
+                    preroll.append(buffer)
+                    if r.dynamic_energy_threshold:
+                        damping = r.dynamic_energy_adjustment_damping ** chunk_seconds
+                        r.energy_threshold = r.energy_threshold * damping + energy * r.dynamic_energy_ratio * (1 - damping)
+                # Hipoteza częściowa co partial_interval sekund trwającej wypowiedzi
+                if frames and self.partial_interval:
+                    since_partial += chunk_seconds
+                    if since_partial >= self.partial_interval:
+                        since_partial = 0.0
+                        self.partial_queue.put(sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH))
+                if frames and (silence >= self.pause_threshold or len(frames) * chunk_seconds >= self.phrase_time_limit):
+                    self.emit(frames)
+                    frames = []
+                    silence = 0.0
+                    since_partial = 0.0
+            if frames:
+                self.emit(frames)
+        except Exception as e:
+            logging.error(f"Błąd nasłuchu STT: {e}")
+        finally:
+            self.audio_queue.put(None)
+            self.partial_queue.put(None)
+
+    def emit(self, frames):
+        source = self.source
+        self.audio_queue.put(sr.AudioData(b"".join(frames), source.SAMPLE_RATE, source.SAMPLE_WIDTH))
+        self.speaking.clear()
+
+    def recognize_loop(self):
+        done = False
+        while not done:
+            # Wszystkie nagrania, które zdążyły się zebrać, idą do silnika jedną paczką
+            batch = [self.audio_queue.get()]
+            while len(batch) < self.batch_size and not self.audio_queue.empty():
+                batch.append(self.audio_queue.get())
+            if None in batch:
+                done = True
+            audios = [audio for audio in batch if audio is not None]
+            try:
+                texts = self.backend.transcribe(audios, self.language) if audios else []
+            except Exception as e:
+                logging.error(f"Błąd silnika STT {self.backend.name}: {e}")
+                texts = []
+            for text in texts:
+                if text:
+                    self.utterances.put(text)
+            for _ in batch:
+                self.audio_queue.task_done()
+        self.finished.set()
+
+    def add_partial_callback(self, callback):
+        # callback(text) - wołany z wątku w tle, gdy użytkownik jeszcze mówi
+        self.partial_callbacks.append(callback)
+
+    def partial_loop(self):
+        while True:
+            audio = self.partial_queue.get()
+            # Liczy się tylko najnowszy stan wypowiedzi - starsze pomijamy
+            while audio is not None and not self.partial_queue.empty():
+                audio = self.partial_queue.get()
+            if audio is None:
+                break
+            try:
+                text = self.backend.transcribe([audio], self.language)[0]
+            except Exception as e:
+                logging.debug(f"Błąd hipotezy częściowej STT: {e}")
+                continue
+            if text and self.speaking.is_set():
+                logging.debug(f"🎤 (częściowo) {text}")
+                for callback in self.partial_callbacks:
+                    try:
+                        callback(text)
+                    except Exception as e:
+                        logging.error(f"Błąd obsługi hipotezy częściowej: {e}")
+
+    def get(self, timeout=5):
+        # Następna wypowiedź albo "" po timeout (jak dawniej przy WaitTimeoutError)
         try:
-            audio = r.listen(source, timeout=5)  
-            text = r.recognize_google(audio, language="pl-PL")
-            return text
-        except sr.WaitTimeoutError:
-            return ""  #czekanie
-        except sr.UnknownValueError:
-            return ""  #wtf
-        except sr.RequestError as e:
-            return f"Błąd połączenia ze STT: {str(e)}"
\ No newline at end of file
+            return self.utterances.get(timeout=timeout)
+        except Empty:
+            pass
+        # Ktoś właśnie mówi albo nagranie jest rozpoznawane - czekamy na wynik
+        while self.speaking.is_set() or self.audio_queue.unfinished_tasks:
+            try:
+                return self.utterances.get(timeout=0.1)
+            except Empty:
+                continue
+        return ""
+
+    def listen_turn(self, window=1.0):
+        # Wypowiedź człowieka albo "" dopiero, gdy przez `window` s nikt nie mówił - liczone od
+        # wybrzmienia bota (z ogonem echa, kiedy mikrofon jest wtedy pomijany) i od ostatniego
+        # głosu powyżej progu. Trwająca wypowiedź albo jej rozpoznawanie wstrzymuje turę botów.
+        tail = self.echo_tail if self.gate_playback else 0.0
+        while True:
+            try:
+                return self.utterances.get(timeout=0.05)
+            except Empty:
+                pass
+            if self.speaking.is_set() or self.audio_queue.unfinished_tasks:
+                continue
+            if self.finished.is_set() and self.utterances.empty():
+                return ""
+            quiet = min(playback.quiet_for() - tail, time.time() - self.last_voice)
+            if quiet >= window:
+                return ""
+
+_listener = None
+
+def get_listener():
+    global _listener
+    if _listener is None:
+        _listener = Listener().start()
+    return _listener
+
+def listen(timeout=5):
+    print(f"🎤 Mów teraz... ({timeout} sekund na rozpoczęcie)")
+    return get_listener().get(timeout)
+
+def load_audio_file(path):
+    with sr.AudioFile(path) as source:
+        return sr.Recognizer().record(source)
+
+def benchmark(paths, backends=("google", "whisper")):
+    # Dla każdego silnika: czas ładowania, czas do tekstu i RTF (czas rozpoznania / długość nagrania).
+    # Nagrania z prawdziwą polską mową podaje użytkownik - w repozytorium są tylko tony do testów nasłuchu.
+    # backends - nazwy z BACKENDS albo gotowe obiekty z transcribe()
+    # -> {nazwa: {"load", "rtf", "time_to_text", "files": [{"path", "duration", "time_to_text", "rtf", "text"}]}}
+    audios = [(path, load_audio_file(path)) for path in paths]
+    results = {}
+    for backend in backends:
+        if isinstance(backend, str):
+            backend = create_backend(backend)
+        name = backend.name
+        load_time = 0.0
+        if hasattr(backend, "load"):
+            start = time.time()
+            backend.load()
+            load_time = time.time() - start
+            logging.info(f"[{name}] ładowanie modelu: {load_time:.2f}s")
+        total_audio = total_time = 0.0
+        files = []
+        for path, audio in audios:
+            duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+            # Czas do tekstu liczony od końca wypowiedzi - całe nagranie jest już "usłyszane"
+            start = time.time()
+            text = backend.transcribe([audio])[0]
+            elapsed = time.time() - start
+            total_audio += duration
+            total_time += elapsed
+            files.append({"path": path, "duration": duration, "time_to_text": elapsed,
+                          "rtf": elapsed / duration if duration else 0.0, "text": text})
+            logging.info(f"[{name}] {os.path.basename(path)}: {duration:.2f}s audio, tekst po {elapsed:.2f}s, "
+                         f"RTF {elapsed / duration:.2f} -> '{text}'")
+        rtf = total_time / total_audio if total_audio else 0.0
+        time_to_text = total_time / len(files) if files else 0.0
+        if total_audio:
+            logging.info(f"[{name}] średni RTF: {rtf:.2f}, średni czas do tekstu: {time_to_text:.2f}s")
+        results[name] = {"load": load_time, "rtf": rtf, "time_to_text": time_to_text, "files": files}
+    return results
+
+if __name__ == "__main__":
+    # python stt.py plik.wav [plik.wav ...] albo STT_BENCH_DIR=katalog_z_nagraniami python stt.py
+    # Potrzebne są własne nagrania polskiej mowy (WAV) - fixtures/stt/bursts.wav to same tony:
+    # Google zwraca na nich "", a Whisper zmyśla, więc nic by nie powiedziały o silnikach.
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    paths = sys.argv[1:]
+    if not paths and os.getenv("STT_BENCH_DIR"):
+        paths = sorted(glob.glob(os.path.join(os.getenv("STT_BENCH_DIR"), "*.wav")))
+    if not paths:
+        logging.error("Podaj nagrania polskiej mowy: python stt.py plik.wav ... albo STT_BENCH_DIR=katalog")
+        sys.exit(2)
+    benchmark(paths)
@@ -0,0 +1,63 @@
+import json
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class StubHandler(BaseHTTPRequestHandler):
+    # Atrapa /v1/chat/completions: czeka `delay` sekund i odsyła stałą odpowiedź
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        time.sleep(self.server.delay)
+        self.server.requests.append(request)
+        body = json.dumps({
+            "id": f"stub-{len(self.server.requests)}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.server.reply},
+                "finish_reason": "stop",
+            }],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class StubOpenAI:
+    """Lokalny serwer udający API OpenAI - odpowiedź po stałym opóźnieniu.
+
+    Z OPENAI_BASE_URL=stub.base_url serwer czatu rozmawia z atrapą zamiast z
+    OpenAI, więc da się sprawdzić, czy czekanie na LLM nie blokuje pętli zdarzeń.
+    """
+
+    def __init__(self, delay=0.5, reply="Odpowiedź atrapy."):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        self.server.daemon_threads = True
+        self.server.delay = delay
+        self.server.reply = reply
+        self.server.requests = []
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,82 @@
+import time
+import threading
+import functools
+from actors import ActorThread, Envelope, BROADCAST, stub_responder
+
+class Speaker:
+    # Atrapa głośnika: zapisuje, kto mówił, i sprawdza, że nikt nie mówi naraz
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.spoken = []
+        self.active = 0
+        self.overlaps = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, text, name):
+        with self.lock:
+            self.active += 1
+            self.overlaps += self.active > 1
+        time.sleep(self.latency)
+        with self.lock:
+            self.active -= 1
+            self.spoken.append(name)
+
+def make_actors(speaker, llm_latency=0.0):
+    return ActorThread(responder=functools.partial(stub_responder, latency=llm_latency), speaker=speaker,
+                       serial_speaker=True, workers=8)
+
+def test_human_broadcast_reaches_every_bot_and_speech_is_serialized():
+    speaker = Speaker()
+    actors = make_actors(speaker)
+    try:
+        bots = [actors.spawn(f"bot{i}", f"Jesteś botem numer {i}.") for i in range(3)]
+        replies = actors.ask(Envelope("człowiek", BROADCAST, "Cześć wszystkim", 1))
+        assert sorted(reply.sender for reply in replies) == ["bot0", "bot1", "bot2"]
+        assert all(reply.recipient == "człowiek" for reply in replies)
+        actors.join()
+        assert sorted(speaker.spoken) == ["bot0", "bot1", "bot2"]
+        assert speaker.overlaps == 0
+        assert bots[0].memory.build_messages("", "x")[1]["content"] == "Cześć wszystkim"
+    finally:
+        actors.shutdown()
+
+def test_reply_arrives_before_speech_ends():
+    speaker = Speaker(latency=0.5)
+    actors = make_actors(speaker)
+    try:
+        actors.spawn("bot0", "Jesteś botem.")
+        start = time.time()
+        [reply] = actors.ask(Envelope("prowadzący", "bot0", "Co słychać?", 1))
+        # Następny bot może liczyć odpowiedź, gdy ten jeszcze mówi
+        assert time.time() - start < 0.4
+        assert reply.text == "Odpowiedź na: Co słychać?"
+        actors.join()
+        assert speaker.spoken == ["bot0"]
+    finally:
+        actors.shutdown()
+
+def test_hush_drops_queued_speech():
+    speaker = Speaker(latency=0.2)
+    actors = make_actors(speaker)
+    try:
+        for i in range(3):
+            actors.spawn(f"bot{i}", "Jesteś botem.")
+        actors.ask(Envelope("człowiek", BROADCAST, "Cześć", 1))
+        time.sleep(0.05)
+        actors.hush()
+        actors.join()
+        assert len(speaker.spoken) == 1
+        assert actors.runtime.metrics()["skipped"] == 2
+    finally:
+        actors.shutdown()
+
+def test_ask_returns_when_bot_fails():
+    def broken(messages):
+        raise RuntimeError("awaria")
+    actors = ActorThread(responder=broken, speaker=Speaker(), serial_speaker=True)
+    try:
+        actors.spawn("bot0", "Jesteś botem.")
+        assert actors.ask(Envelope("prowadzący", "bot0", "Co słychać?", 1)) == []
+        assert actors.runtime.metrics()["errors"] == 1
+    finally:
+        actors.shutdown()
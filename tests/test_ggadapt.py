@@ -0,0 +1,58 @@
+import wave
+import pytest
+from ggadapt import AUDIBLE, LinkQualityEstimator
+
+def test_ranks_by_nominal_rate_until_every_protocol_is_measured():
+    estimator = LinkQualityEstimator(AUDIBLE)
+    # Zmierzona przepustowość najwolniejszego nie może go wypchnąć przed niezmierzone szybsze
+    estimator.record(0, True, latency=1.0, size=6)
+    assert estimator.ranked() == [2, 1, 0]
+    estimator.record(2, True, latency=1.0, size=4)
+    estimator.record(1, True, latency=1.0, size=5)
+    assert estimator.ranked() == [0, 1, 2]
+
+def test_falls_back_to_slower_protocol_after_failures():
+    estimator = LinkQualityEstimator(AUDIBLE, window=4)
+    assert estimator.choose() == 2
+    for _ in range(4):
+        estimator.record(2, False)
+    assert estimator.choose() == 1
+    for _ in range(4):
+        estimator.record(1, False)
+    assert estimator.choose() == 0
+
+def test_peek_does_not_consume_probe():
+    estimator = LinkQualityEstimator(AUDIBLE, window=4, probe_every=3)
+    for _ in range(4):
+        estimator.record(2, False)
+    for _ in range(3):
+        estimator.record(1, True)
+    # Spekulacja może pytać dowolnie często - próba szybszego protokołu czeka na choose()
+    assert estimator.peek() == 2
+    assert estimator.peek() == 2
+    assert estimator.since_probe == 3
+    assert estimator.choose() == 2
+    assert estimator.since_probe == 0
+    assert estimator.peek() == 2  # wyniki próbowanego wyczyszczone - nieznany = warto spróbować
+
+def test_record_fixture_decodes_recording(tmp_path):
+    np = pytest.importorskip("numpy")
+    pytest.importorskip("ggwave")
+    try:
+        from gglink import prepare_ggwave
+    except (ImportError, OSError) as e:  # sounddevice bez biblioteki PortAudio rzuca OSError
+        pytest.skip(f"gglink niedostępny: {e}")
+    text = "bot0: nagranie testowe"
+    audio = prepare_ggwave(text, 1, compress=False)
+    silence = np.zeros(48000 // 2, dtype=np.float32)
+    samples = np.concatenate([silence, audio, silence])
+    path = tmp_path / "ggwave.wav"
+    with wave.open(str(path), "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(48000)
+        wf.writeframes((np.clip(samples, -1.0, 1.0) * 32767).astype(np.int16).tobytes())
+    estimator = LinkQualityEstimator(AUDIBLE)
+    assert estimator.record_fixture(1, str(path), text)
+    assert estimator.results[1][-1] is True
+    assert not estimator.record_fixture(1, str(path), "inna wiadomość")
@@ -0,0 +1,36 @@
+from ggcodec import MARKER, decode_payload, encode_payload
+from ggframe import Reassembler, frame_message
+
+LONG = "Jestem pisarzem i bardzo lubię rozmawiać o książkach, historii i muzyce. " * 3
+
+def test_short_message_passes_through():
+    assert Reassembler().feed("Cześć, co słychać?") == "Cześć, co słychać?"
+
+def test_ignores_unframed_text_while_message_is_pending():
+    message_id, frames = frame_message(LONG)
+    reassembler = Reassembler()
+    assert reassembler.feed(frames[0]) is None
+    # Przekłamanie dekodera w trakcie składania nie może udawać odebranej wiadomości
+    assert reassembler.feed("b'~N402") is None
+    assert reassembler.rejected == 1
+    for frame in frames[1:]:
+        message = reassembler.feed(frame)
+    assert message == LONG
+
+def test_rejects_garbled_frame_headers():
+    reassembler = Reassembler()
+    assert reassembler.feed("~D0z01") is None
+    assert reassembler.feed("~N4") is None
+    assert reassembler.rejected == 2
+
+def test_pending_message_expires():
+    _, frames = frame_message(LONG)
+    reassembler = Reassembler(pending_hold=0.0)
+    reassembler.feed(frames[0])
+    assert reassembler.feed("Nowa wiadomość") == "Nowa wiadomość"
+
+def test_corrupted_packed_payload_is_not_delivered():
+    packed = encode_payload(LONG)
+    assert packed.startswith(MARKER)
+    assert decode_payload(packed) == LONG
+    assert decode_payload(packed[:-5] + "!!!!!") is None
@@ -0,0 +1,50 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("ggwave")
+try:
+    import gglink
+except (ImportError, OSError) as e:  # sounddevice bez biblioteki PortAudio rzuca OSError
+    pytest.skip(f"gglink niedostępny: {e}", allow_module_level=True)
+
+class DeviceSource:
+    # Jak karta dźwiękowa: wynik callbacku jest ignorowany, blok nie wróci
+    samplerate = 48000
+    blocksize = 1024
+
+def feed(engine, blocks):
+    block = np.zeros((engine.source.blocksize, 1), dtype=np.float32)
+    return [engine.callback(block, engine.source.blocksize, None, None) for _ in range(blocks)]
+
+def test_full_ring_is_backpressure_for_lossless_source():
+    engine = gglink.AudioEngine(gglink.FileSource(np.zeros(1024)), ring_blocks=2)
+    assert feed(engine, 4) == [True, True, False, False]
+    assert engine.metrics()["ring_overruns"] == 0
+    assert engine.metrics()["backpressure_waits"] == 2
+
+def test_full_ring_drops_blocks_from_device():
+    engine = gglink.AudioEngine(DeviceSource(), ring_blocks=2)
+    feed(engine, 5)
+    assert engine.metrics()["ring_overruns"] == 3
+    assert engine.metrics()["backpressure_waits"] == 0
+
+class FakeListener:
+    def __init__(self):
+        self.calls = []
+
+    def pause(self):
+        self.calls.append("pause")
+
+    def resume(self):
+        self.calls.append("resume")
+
+def test_broadcast_exchange_reaches_every_receiver():
+    from ggbus import VirtualAudioBus
+    engine = gglink.AudioEngine(VirtualAudioBus().source())
+    listener = FakeListener()
+    text = "bot0: Cześć wszystkim, co słychać?"
+    received = gglink.broadcast_exchange("bot0", ["bot1", "bot2"], text, protocol=2, engine=engine,
+                                         listener=listener)
+    assert sorted(received) == [("bot1", text), ("bot2", text)]
+    assert listener.calls == ["pause", "resume"]
+    assert list(gglink.link_quality.results[2])[-1] is True
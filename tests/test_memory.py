@@ -0,0 +1,34 @@
+import random
+from memory import ConversationMemory, count_tokens
+
+def total_tokens(messages):
+    return sum(count_tokens(message["content"]) for message in messages)
+
+def test_stays_within_budget_when_summary_is_created():
+    memory = ConversationMemory(max_turns=12, token_budget=50, summary_tokens=20)
+    memory.add("user", "Cześć, jak się masz? Opowiedz mi coś o sobie.")
+    memory.add("assistant", "Jestem botem. Lubię rozmawiać o książkach i muzyce.")
+    memory.add("user", "A jaka jest dziś pogoda w twoim mieście?")
+    memory.add("assistant", "Dzisiaj jest słonecznie i ciepło, idealnie na spacer.")
+    messages = memory.build_messages("Jesteś pisarzem.", "Co czytasz?")
+    assert total_tokens(messages) <= 50
+    assert memory.summary
+
+def test_stays_within_budget_over_long_conversation():
+    rng = random.Random(0)
+    words = "bot rozmowa książka muzyka pogoda świat dzień czas praca dom".split()
+    memory = ConversationMemory(max_turns=8, token_budget=120, summary_tokens=30)
+    for turn in range(60):
+        text = " ".join(rng.choice(words) for _ in range(rng.randint(2, 25))) + "."
+        messages = memory.build_messages("Jesteś pomocnym botem.", text)
+        assert total_tokens(messages) <= 120, turn
+        memory.add("user", text)
+        memory.add("assistant", text[::-1])
+
+def test_short_history_is_sent_whole():
+    memory = ConversationMemory(token_budget=300)
+    memory.add("user", "Cześć")
+    memory.add("assistant", "Witaj")
+    messages = memory.build_messages("Jesteś botem.", "Co słychać?")
+    assert [m["content"] for m in messages] == ["Jesteś botem.", "Cześć", "Witaj", "Co słychać?"]
+    assert not memory.summary
@@ -0,0 +1,65 @@
+import sys
+import json
+import time
+import asyncio
+import importlib
+import urllib.request
+import pytest
+from openai_stub import StubOpenAI
+
+DELAY = 0.5
+
+@pytest.fixture
+def serwer(monkeypatch):
+    for module in ("fastapi", "openai", "httpx", "uvicorn", "pyngrok", "dotenv"):
+        pytest.importorskip(module)
+    with StubOpenAI(delay=DELAY) as stub:
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+        monkeypatch.setenv("OPENAI_BASE_URL", stub.base_url)
+        sys.modules.pop("serwer", None)
+        module = importlib.import_module("serwer")
+        module.stub = stub
+        yield module
+        sys.modules.pop("serwer", None)
+
+def test_stub_answers_after_delay():
+    with StubOpenAI(delay=0.1, reply="ok") as stub:
+        request = urllib.request.Request(
+            f"{stub.base_url}/chat/completions",
+            data=json.dumps({"model": "gpt-3.5-turbo", "messages": []}).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+        )
+        start = time.time()
+        with urllib.request.urlopen(request) as response:
+            body = json.loads(response.read())
+        assert time.time() - start >= 0.1
+        assert body["choices"][0]["message"]["content"] == "ok"
+        assert len(stub.requests) == 1
+
+def test_respond_does_not_block_event_loop(serwer):
+    async def scenario():
+        ticks = 0
+        stop = asyncio.Event()
+
+        async def ticker():
+            nonlocal ticks
+            while not stop.is_set():
+                ticks += 1
+                await asyncio.sleep(0.01)
+
+        task = asyncio.create_task(ticker())
+        bots = [serwer.Bot(f"id{i}", f"Bot{i}", "pisarzem", "owner") for i in range(4)]
+        start = time.time()
+        answers = await asyncio.gather(*(bot.respond("Cześć!") for bot in bots))
+        elapsed = time.time() - start
+        stop.set()
+        await task
+        await serwer.http_client.aclose()
+        return ticks, answers, elapsed
+
+    ticks, answers, elapsed = asyncio.run(scenario())
+    assert answers == ["Odpowiedź atrapy."] * 4
+    assert len(serwer.stub.requests) == 4
+    # Cztery zapytania naraz trwają jak jedno, a pętla w tym czasie dalej tyka
+    assert elapsed < 2 * DELAY
+    assert ticks >= DELAY / 0.01 / 2
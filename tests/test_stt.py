@@ -0,0 +1,144 @@
+import os
+import time
+import threading
+import pytest
+
+sr = pytest.importorskip("speech_recognition")
+pytest.importorskip("numpy")
+import playback
+from stt import Listener, benchmark
+
+FIXTURE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "stt", "bursts.wav")
+
+class FakeBackend:
+    # Zamiast prawdziwego STT: "tekst" to długość nagrania w sekundach
+    name = "fake"
+    streaming = False
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def transcribe(self, audios, language="pl-PL"):
+        with self.lock:
+            self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return [f"{len(audio.frame_data) / (audio.sample_rate * audio.sample_width):.1f}" for audio in audios]
+
+def run_listener(backend):
+    listener = Listener(sr.AudioFile(FIXTURE), backend=backend, calibrate=False, partial_interval=0)
+    listener.start()
+    assert listener.finished.wait(timeout=10)
+    listener.stop()
+    utterances = []
+    while not listener.utterances.empty():
+        utterances.append(float(listener.utterances.get()))
+    return utterances
+
+def test_splits_fixture_into_utterances():
+    utterances = run_listener(FakeBackend())
+    assert len(utterances) == 2
+    # Ton 0.8 s + przedbieg i cisza do pause_threshold, zaokrąglone do bloków po 0.256 s
+    for seconds in utterances:
+        assert 0.8 <= seconds <= 3.0
+
+def test_ignores_microphone_while_bot_plays():
+    backend = FakeBackend()
+    with playback.playing():
+        utterances = run_listener(backend)
+    assert utterances == []
+    assert backend.calls == 0
+
+def test_benchmark_reports_real_time_factor():
+    results = benchmark([FIXTURE], backends=[FakeBackend(latency=0.49)])
+    assert set(results) == {"fake"}
+    # Nagranie ma 4.9 s, a atrapa "rozpoznaje" je w ~0.49 s
+    assert 0.09 <= results["fake"]["rtf"] < 0.2
+    assert 0.49 <= results["fake"]["time_to_text"] < 1.0
+    [result] = results["fake"]["files"]
+    assert result["path"] == FIXTURE
+    assert result["duration"] == pytest.approx(4.9)
+    assert result["time_to_text"] >= 0.49
+    assert result["text"] == "4.9"
+
+class ScriptedSource:
+    # Źródło jak sr.AudioFile, ale fragment po fragmencie: "tone"/"quiet", a on_chunk(i) pozwala
+    # np. włączyć odtwarzanie bota w środku wypowiedzi
+    CHUNK = 1024
+    SAMPLE_RATE = 16000
+    SAMPLE_WIDTH = 2
+
+    def __init__(self, script, on_chunk=None):
+        import numpy as np
+        t = np.arange(self.CHUNK) / self.SAMPLE_RATE
+        self.chunks = {
+            "tone": (8000 * np.sin(2 * np.pi * 440 * t)).astype(np.int16).tobytes(),
+            "quiet": np.zeros(self.CHUNK, dtype=np.int16).tobytes(),
+        }
+        self.script = list(script)
+        self.on_chunk = on_chunk
+        self.position = 0
+        self.stream = self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def read(self, size):
+        if self.position >= len(self.script):
+            return b""
+        if self.on_chunk is not None:
+            self.on_chunk(self.position)
+        chunk = self.chunks[self.script[self.position]]
+        self.position += 1
+        return chunk
+
+def test_keeps_utterance_started_before_playback():
+    bot = playback.playing()
+    source = ScriptedSource(["quiet"] * 3 + ["tone"] * 10 + ["quiet"] * 5,
+                            on_chunk=lambda i: bot.__enter__() if i == 8 else None)
+    backend = FakeBackend()
+    listener = Listener(source, backend=backend, calibrate=False, partial_interval=0)
+    try:
+        listener.start()
+        assert listener.finished.wait(timeout=10)
+        listener.stop()
+    finally:
+        bot.__exit__(None, None, None)
+    # Człowiek zaczął przed botem: 5 fragmentów tonu (+ przedbieg) trafia do rozpoznania
+    assert backend.calls == 1
+    assert float(listener.utterances.get_nowait()) >= 5 * ScriptedSource.CHUNK / ScriptedSource.SAMPLE_RATE
+
+def test_pause_keeps_started_utterance():
+    listener = Listener(ScriptedSource(["tone"] * 4 + ["quiet"] * 200), backend=FakeBackend(),
+                        calibrate=False, partial_interval=0, echo_tail=0.0)
+    listener.source.on_chunk = lambda i: listener.paused.set() if i == 4 else None
+    listener.start()
+    assert listener.released.wait(timeout=5)
+    assert float(listener.utterances.get(timeout=5)) > 0
+    listener.stop()
+
+def test_listen_turn_waits_for_echo_tail_and_window():
+    listener = Listener(ScriptedSource([]), backend=FakeBackend(), calibrate=False, partial_interval=0, echo_tail=0.3)
+    with playback.playing():
+        pass
+    start = time.time()
+    assert listener.listen_turn(window=0.2) == ""
+    assert time.time() - start >= 0.45
+
+def test_listen_turn_is_held_while_human_speaks():
+    listener = Listener(ScriptedSource([]), backend=FakeBackend(), calibrate=False, partial_interval=0)
+    listener.speaking.set()
+    threading.Timer(0.4, listener.speaking.clear).start()
+    start = time.time()
+    assert listener.listen_turn(window=0.1) == ""
+    assert time.time() - start >= 0.4
+    # Głos sprzed chwili też przedłuża okno
+    listener.last_voice = time.time()
+    start = time.time()
+    assert listener.listen_turn(window=0.3) == ""
+    assert time.time() - start >= 0.25
@@ -1,21 +1,279 @@
+import io
 import os
+import re
+import itertools
 import tempfile
-from gtts import gTTS
-from playsound import playsound
+import threading
+import wave
+import struct
 import logging
+from collections import namedtuple
+from queue import Queue, Empty, Full
+import numpy as np
+import sounddevice as sd
+import miniaudio
+from gtts import gTTS
+from cache import TieredCache, make_key
+import playback
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
-#tutaj mp3 
-def speak(text):
-    if not text or not text.strip():
+
+# Zsyntetyzowana mowa: próbki float32 (mono) + częstotliwość próbkowania
+Audio = namedtuple("Audio", ["samples", "samplerate"])
+
+# Silnik TTS to dowolna klasa z atrybutem name i metodą synthesize(text, lang) -> Audio
+
+class GTTSBackend:
+    # gTTS do bufora w pamięci, dekodowanie mp3 -> PCM przez miniaudio (bez plików tymczasowych)
+    name = "gtts"
+
+    def synthesize(self, text, lang="pl"):
+        buffer = io.BytesIO()
+        gTTS(text=text, lang=lang).write_to_fp(buffer)
+        decoded = miniaudio.decode(buffer.getvalue(), output_format=miniaudio.SampleFormat.FLOAT32, nchannels=1)
+        return Audio(np.asarray(decoded.samples, dtype=np.float32), decoded.sample_rate)
+
+class Pyttsx3Backend:
+    # Lokalny silnik offline. pyttsx3 umie renderować tylko do pliku, więc tworzymy
+    # krótki WAV i od razu wczytujemy go do pamięci
+    name = "pyttsx3"
+
+    def __init__(self, voice=None):
+        self.voice = voice
+        self.engine = None
+        self.lock = threading.Lock()
+
+    def get_engine(self, lang):
+        if self.engine is None:
+            import pyttsx3
+            self.engine = pyttsx3.init()
+            voice_id = self.voice
+            if voice_id is None:
+                for voice in self.engine.getProperty("voices"):
+                    if lang in str(voice.languages).lower() or lang in voice.id.lower():
+                        voice_id = voice.id
+                        break
+            if voice_id:
+                self.engine.setProperty("voice", voice_id)
+        return self.engine
+
+    def synthesize(self, text, lang="pl"):
+        with self.lock:
+            engine = self.get_engine(lang)
+            fd, path = tempfile.mkstemp(suffix=".wav")
+            os.close(fd)
+            try:
+                engine.save_to_file(text, path)
+                engine.runAndWait()
+                return read_wav(path)
+            finally:
+                os.remove(path)
+
+def read_wav(path):
+    with wave.open(path, "rb") as wf:
+        width = wf.getsampwidth()
+        channels = wf.getnchannels()
+        frames = wf.readframes(wf.getnframes())
+        samplerate = wf.getframerate()
+    dtype = {1: np.uint8, 2: np.int16, 4: np.int32}[width]
+    samples = np.frombuffer(frames, dtype=dtype).astype(np.float32)
+    if width == 1:
+        samples = (samples - 128) / 128
+    else:
+        samples /= float(2 ** (8 * width - 1))
+    if channels > 1:
+        samples = samples.reshape(-1, channels).mean(axis=1)
+    return Audio(samples, samplerate)
+
+BACKENDS = {"gtts": GTTSBackend, "pyttsx3": Pyttsx3Backend}
+_backend = None
+
+def get_backend():
+    # Wybór silnika przez TTS_BACKEND (domyślnie gtts)
+    global _backend
+    if _backend is None:
+        name = os.getenv("TTS_BACKEND", "gtts")
+        _backend = BACKENDS[name]()
+        logging.info(f"Silnik TTS: {name}")
+    return _backend
+
+def set_backend(backend):
+    global _backend
+    _backend = backend
+
+def dump_audio(audio):
+    return struct.pack("<I", audio.samplerate) + audio.samples.astype(np.float32).tobytes()
+
+def load_audio(data):
+    return Audio(np.frombuffer(data, dtype=np.float32, offset=4), struct.unpack_from("<I", data)[0])
+
+# Cache nagrań fraz: pamięć + opcjonalnie katalog na dysku (TTS_CACHE_DIR)
+audio_cache = TieredCache(
+    maxsize=int(os.getenv("TTS_CACHE_SIZE", "128")),
+    disk_dir=os.getenv("TTS_CACHE_DIR") or None,
+    ttl=float(os.getenv("TTS_CACHE_TTL", str(7 * 24 * 3600))),
+    max_bytes=200 * 1024 * 1024,
+    dumps=dump_audio,
+    loads=load_audio
+)
+
+def synthesize_segment(text, lang="pl"):
+    backend = get_backend()
+    key = make_key(text.strip(), lang, backend.name, getattr(backend, "voice", None))
+    return audio_cache.get_or_compute(key, lambda: backend.synthesize(text, lang))
+
+def resample(audio, samplerate):
+    if audio.samplerate == samplerate:
+        return audio.samples
+    samples = audio.samples
+    length = int(len(samples) * samplerate / audio.samplerate)
+    return np.interp(np.linspace(0, len(samples) - 1, length), np.arange(len(samples)), samples).astype(np.float32)
+
+def join_audio(parts, pause=0.08):
+    # Sklejanie segmentów w jedno nagranie (z krótką pauzą między nimi)
+    samplerate = parts[0].samplerate
+    pieces = []
+    for audio in parts:
+        samples = resample(audio, samplerate)
+        if pieces:
+            pieces.append(np.zeros(int(pause * samplerate), dtype=np.float32))
+        pieces.append(samples)
+    return Audio(np.concatenate(pieces), samplerate)
+
+def speaker_segments(text, speaker=None):
+    # "<nazwa> mówi:" to osobny segment, więc trafia do cache niezależnie od treści
+    return [f"{speaker} mówi:", text] if speaker else [text]
+
+def synthesize(text, lang="pl", speaker=None):
+    # Sama synteza (bez odtwarzania) - zwraca Audio dla play()
+    return join_audio([synthesize_segment(segment, lang) for segment in speaker_segments(text, speaker)])
+
+def prepare(text, lang="pl", speaker=None):
+    # Rozgrzewa cache tymi samymi fragmentami, na które speak() potnie tekst - potem mówi od razu
+    prefix = [f"{speaker} mówi:"] if speaker else []
+    for segment in itertools.chain(prefix, split_sentences(text)):
+        synthesize_segment(segment, lang)
+
+def play(audio, cancelled=None):
+    # cancelled - zdarzenie przerwania tej wypowiedzi (może przyjść, zanim odtwarzanie ruszy)
+    if cancelled is not None and cancelled.is_set():
+        return
+    with playback.playing():
+        sd.play(audio.samples, samplerate=audio.samplerate)
+        if cancelled is None:
+            sd.wait()
+        elif cancelled.wait(len(audio.samples) / audio.samplerate):
+            sd.stop()
+        else:
+            sd.wait()
+
+# Koniec zdania lub członu zdania, po którym można zacząć mówić
+SENTENCE_END = re.compile(r"[.!?…;:]+\s+")
+
+def split_sentences(source):
+    # source: cały tekst albo iterowalne fragmenty (np. tokeny ze strumienia LLM)
+    if isinstance(source, str):
+        source = [source]
+    buffer = ""
+    for piece in source:
+        buffer += piece
+        while (match := SENTENCE_END.search(buffer)):
+            sentence = buffer[:match.end()].strip()
+            buffer = buffer[match.end():]
+            if sentence:
+                yield sentence
+    if buffer.strip():
+        yield buffer.strip()
+
+class SpeechPipeline:
+    """Mówienie zdanie po zdaniu: fragment N+1 syntetyzuje się w tle, gdy N jest odtwarzany.
+
+    Odtwarzanie idzie przez jeden otwarty strumień wyjściowy (bez przerw między
+    fragmentami) i można je przerwać przez cancel() albo zdarzenie `cancelled`
+    podane przez wołającego (wtedy przerwanie sprzed startu też działa).
+    """
+
+    def __init__(self, lang="pl", prefetch=2, blocksize=2048):
+        self.lang = lang
+        self.prefetch = prefetch
+        self.blocksize = blocksize
+        self.cancelled = threading.Event()
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def put(self, chunks, item, cancelled):
+        while not cancelled.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except Full:
+                continue
+
+    def synthesize_worker(self, source, speaker, chunks, cancelled):
+        try:
+            prefix = [f"{speaker} mówi:"] if speaker else []
+            for text in itertools.chain(prefix, split_sentences(source)):
+                if cancelled.is_set():
+                    break
+                self.put(chunks, synthesize_segment(text, self.lang), cancelled)
+        except Exception as e:
+            logging.error(f"Błąd syntezy fragmentu TTS: {e}")
+        finally:
+            self.put(chunks, None, cancelled)
+
+    def speak(self, source, speaker=None, cancelled=None):
+        # Każda wypowiedź ma własne zdarzenie - nie zerujemy przerwania, które już przyszło
+        if cancelled is None:
+            cancelled = threading.Event()
+        self.cancelled = cancelled
+        chunks = Queue(maxsize=self.prefetch)
+        worker = threading.Thread(target=self.synthesize_worker, args=(source, speaker, chunks, cancelled), daemon=True)
+        worker.start()
+        stream = None
+        try:
+            while not cancelled.is_set():
+                try:
+                    audio = chunks.get(timeout=0.1)
+                except Empty:
+                    continue
+                if audio is None:
+                    break
+                if stream is None:
+                    stream = sd.OutputStream(samplerate=audio.samplerate, channels=1, dtype="float32")
+                    stream.start()
+                samples = resample(audio, int(stream.samplerate)).reshape(-1, 1)
+                for start in range(0, len(samples), self.blocksize):
+                    if cancelled.is_set():
+                        break
+                    stream.write(samples[start:start + self.blocksize])
+        finally:
+            if stream is not None:
+                if cancelled.is_set():
+                    stream.abort()
+                else:
+                    stream.stop()
+                stream.close()
+            # Odblokowuje wątek syntezy, jeśli odtwarzanie skończyło się wcześniej
+            cancelled.set()
+            worker.join(timeout=1.0)
+
+pipeline = SpeechPipeline()
+
+def cancel():
+    pipeline.cancel()
+
+def speak(text, speaker=None, cancelled=None):
+    # text: napis albo generator fragmentów tekstu (np. prosto ze strumienia LLM)
+    # cancelled: zdarzenie przerwania tej wypowiedzi (np. z turns.interruptible)
+    if not text or (isinstance(text, str) and not text.strip()):
         return
     try:
-        logging.info(f"Mówię: {text}")
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp3") as fp:
-            tts = gTTS(text=text, lang="pl")
-            tts.save(fp.name)
-            temp_path = fp.name
-        playsound(temp_path)
-        os.remove(temp_path)
+        if isinstance(text, str):
+            logging.info(f"Mówię: {speaker + ' mówi: ' if speaker else ''}{text}")
+        else:
+            logging.info(f"Mówię strumieniowo{' jako ' + speaker if speaker else ''}")
+        with playback.playing():
+            pipeline.speak(text, speaker=speaker, cancelled=cancelled)
     except Exception as e:
         logging.error(f"Błąd w TTS: {e}")
@@ -0,0 +1,172 @@
+import heapq
+import itertools
+import logging
+import threading
+
+class TurnScheduler:
+    """Kolejka mówców wśród botów (heapq) zamiast losowania.
+
+    Mniejszy klucz = wcześniej. Klucz rośnie z każdą wypowiedzią bota, więc ci,
+    którzy mówili najmniej, idą pierwsi; bot wywołany po imieniu dostaje
+    jednorazowy bonus. Ten sam bot nie mówi dwa razy z rzędu, jeśli jest ktoś inny.
+    """
+
+    def __init__(self, turn_cost=1.0, mention_boost=2.0):
+        self.turn_cost = turn_cost
+        self.mention_boost = mention_boost
+        self.heap = []  # [klucz, numer, nazwa] - numer rozstrzyga remisy kolejnością dodania
+        self.entries = {}  # nazwa -> aktualny wpis (stare wpisy w kopcu są unieważniane)
+        self.scores = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def push(self, name, score):
+        old = self.entries.get(name)
+        if old is not None:
+            old[2] = None
+        entry = [score, next(self.counter), name]
+        self.entries[name] = entry
+        self.scores[name] = score
+        heapq.heappush(self.heap, entry)
+
+    def add(self, name):
+        # Nowy bot startuje z najmniejszym kluczem w pokoju - nie czeka na wszystkich
+        with self.lock:
+            self.push(name, min(self.scores.values(), default=0.0))
+
+    def remove(self, name):
+        with self.lock:
+            entry = self.entries.pop(name, None)
+            if entry is not None:
+                entry[2] = None
+                del self.scores[name]
+
+    def mention(self, text):
+        # Bot wymieniony w wypowiedzi odpowiada wcześniej
+        text = text.lower()
+        with self.lock:
+            for name in list(self.entries):
+                if name.lower() in text:
+                    self.push(name, self.scores[name] - self.mention_boost)
+
+    def peek(self, exclude=None):
+        # Kto mówiłby teraz - bez zmiany kolejki (np. żeby policzyć jego odpowiedź zawczasu)
+        with self.lock:
+            candidates = sorted(entry for entry in self.heap if entry[2] is not None)
+        for _, _, name in candidates:
+            if name != exclude:
+                return name
+        return candidates[0][2] if candidates else None
+
+    def next(self, exclude=None):
+        # Następny mówca; jego klucz rośnie o koszt tury
+        with self.lock:
+            skipped = []
+            chosen = None
+            while self.heap:
+                entry = heapq.heappop(self.heap)
+                if entry[2] is None:
+                    continue
+                if entry[2] == exclude:
+                    skipped.append(entry)
+                    continue
+                chosen = entry
+                break
+            if chosen is None and skipped:
+                chosen = skipped.pop(0)  # jest tylko ten, który mówił ostatnio
+            for entry in skipped:
+                heapq.heappush(self.heap, entry)
+            if chosen is None:
+                return None
+            name = chosen[2]
+            self.push(name, chosen[0] + self.turn_cost)
+            logging.debug(f"🎙️ Tura: {name} (klucze: {self.scores})")
+            return name
+
+def interruptible(action, speaking, cancel=None, poll=0.05):
+    # action(cancelled) - blokujące mówienie; gdy człowiek zacznie mówić (speaking),
+    # ustawiamy cancelled (i wołamy cancel()). Zdarzenie powstaje przed startem
+    # mówienia, więc przerwanie nie zginie, nawet jeśli przyjdzie bardzo wcześnie.
+    # -> True, jeśli wypowiedź została przerwana
+    done = threading.Event()
+    interrupted = threading.Event()
+    cancelled = threading.Event()
+
+    def watch():
+        while not done.is_set():
+            if speaking.wait(poll):
+                if not done.is_set():
+                    interrupted.set()
+                    logging.info("✋ Człowiek mówi - przerywam bota")
+                    cancelled.set()
+                    if cancel is not None:
+                        cancel()
+                return
+
+    watcher = threading.Thread(target=watch, daemon=True)
+    watcher.start()
+    try:
+        action(cancelled)
+    finally:
+        done.set()
+        watcher.join()
+    return interrupted.is_set()
+
+class Speculator:
+    """Odpowiedzi liczone zawczasu (np. dla następnego mówcy), zanim przyjdzie ich tura.
+
+    Naraz w locie jest najwyżej `budget` spekulacji - nadmiarowe są pomijane, a
+    nie kolejkowane. Spekulacja z kluczem (bot, kontekst) jest ważna tylko dla
+    tej samej tury; discard() - gdy odezwie się człowiek - anuluje te, które
+    jeszcze nie ruszyły, a wyniki pozostałych przepadają.
+    """
+
+    def __init__(self, executor, budget=2):
+        self.executor = executor
+        self.slots = threading.BoundedSemaphore(budget)
+        self.lock = threading.Lock()
+        self.pending = {}  # klucz -> Future
+        self.started = 0
+        self.skipped = 0
+        self.used = 0
+        self.discarded = 0
+
+    def start(self, key, fn, *args):
+        # key None - spekulacja tylko rozgrzewa cache, nikt jej nie odbiera ani nie anuluje
+        with self.lock:
+            if key is not None and key in self.pending:
+                return self.pending[key]
+        if not self.slots.acquire(blocking=False):
+            self.skipped += 1
+            logging.debug(f"⚡ Budżet spekulacji wyczerpany, pomijam {key}")
+            return None
+        future = self.executor.submit(fn, *args)
+        # Slot wraca także po anulowaniu (wtedy fn w ogóle nie ruszy)
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.started += 1
+            if key is not None:
+                self.pending[key] = future
+        return future
+
+    def take(self, key):
+        # -> Future spekulacji dla tej tury albo None
+        with self.lock:
+            future = self.pending.pop(key, None)
+        if future is None or future.cancelled():
+            return None
+        self.used += 1
+        return future
+
+    def discard(self):
+        with self.lock:
+            futures = list(self.pending.values())
+            self.pending.clear()
+        for future in futures:
+            future.cancel()
+        self.discarded += len(futures)
+        if futures:
+            logging.debug(f"⚡ Odrzucono {len(futures)} spekulacji")
+
+    def stats(self):
+        return {"started": self.started, "skipped": self.skipped, "used": self.used, "discarded": self.discarded}